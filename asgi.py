@@ -0,0 +1,8 @@
+"""
+ASGI entry point, run with e.g. `uvicorn asgi:app`.
+"""
+
+from qlit.asgi import AsgiAdapter
+from qlit.server import app as wsgi_app, start_reloading
+
+app = AsgiAdapter(wsgi_app, on_startup=start_reloading)
@@ -0,0 +1,5 @@
+"""
+Benchmarks of the build and the server, on synthetic thesauri.
+
+Run with `python -m bench --help`.
+"""
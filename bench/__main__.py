@@ -0,0 +1,215 @@
+"""
+Run benchmarks of the build stages and server routes on a synthetic thesaurus,
+and save the results as JSON.
+
+    python -m bench --size 10000 --output baseline.json
+    python -m bench --size 10000 --baseline baseline.json
+"""
+
+from argparse import ArgumentParser
+from contextlib import redirect_stdout
+import os
+from os.path import abspath, join
+from random import Random
+import re
+import sys
+from tempfile import TemporaryDirectory
+from typing import Callable, Iterator
+from .generate import generate_thesaurus, write_thesaurus
+from .timing import compare, load_results, measure, save_results
+
+Benchmark = tuple[str, Callable, Callable | None]
+
+
+def log(message: str) -> None:
+    # Stdout is silenced while benchmarking
+    print(message, file=sys.stderr)
+
+
+def build_benchmarks(jobs: int) -> Iterator[Benchmark]:
+    """Benchmarks of each build stage, leaving a built thesaurus file, snapshot and Homosaurus subset."""
+    import build
+    from qlit.homosaurus import write_subset
+    from qlit.ntriples import write_sorted
+    from qlit.skos import skos_complete_graph, skos_validate_graph, skos_warn_graph
+    from qlit.snapshot import read_snapshot
+    from qlit.thesaurus import Thesaurus
+
+    path = build.THESAURUSFILE
+    fns = sorted(build.list_infiles([build.INDIR]))
+    cache = dict()
+    thesaurus, skipped, locations = build.parse_files(fns, jobs, cache)
+
+    def copy(g):
+        # Each round gets a fresh graph to work on
+        return lambda: (Thesaurus() + g,)
+
+    yield 'build.parse_files', lambda: build.parse_files(fns, jobs, dict()), None
+    yield 'build.parse_files.cached', lambda: build.parse_files(fns, jobs, cache), None
+    yield 'build.validate', lambda: list(skos_validate_graph(thesaurus, locations)), None
+    yield 'build.warn', lambda: list(skos_warn_graph(thesaurus, locations)), None
+    yield 'build.randomize_ids', build.randomize_ids, copy(thesaurus)
+    yield 'build.complete', skos_complete_graph, copy(thesaurus)
+
+    skos_complete_graph(thesaurus)
+    yield 'build.check_changes.new', lambda g: build.check_changes(g, []), copy(thesaurus)
+    build.check_changes(thesaurus, [])
+    fingerprints = build.graph_fingerprints(thesaurus)
+    yield 'build.check_changes', lambda g: build.check_changes(g, fingerprints), copy(thesaurus)
+
+    write_sorted(thesaurus, path)
+    build.write_snapshot(thesaurus)
+    yield 'build.write', lambda: write_sorted(thesaurus, path), None
+    yield 'build.read_fingerprints', lambda: list(build.read_fingerprints(path)), None
+    yield 'build.snapshot', lambda: build.write_snapshot(thesaurus), None
+    yield 'load.snapshot', lambda: read_snapshot(path), None
+    # As the build does, with snapshots for the server
+    build.update_subset(thesaurus, dict())
+    yield 'build.homosaurus_subset', lambda: write_subset(thesaurus), None
+
+    # Rebuilding as in `--watch`, after a change to one source file each round
+    incremental = build.IncrementalBuild(fns, jobs, cache, thesaurus)
+    def edit_source():
+        with open(fns[0], 'a') as f:
+            f.write('# Edited\n')
+        return (fns,)
+    yield 'build.incremental', incremental.update, edit_source
+    yield 'build.total', lambda: build.build(fns, jobs, dict(), fingerprints), None
+
+
+def server_benchmarks(seed: int) -> Iterator[Benchmark]:
+    """Benchmarks of each server route, on the built thesaurus file."""
+    from qlit import server
+    from qlit.homosaurus import load_homosaurus
+    from qlit.served import FORMATS, serialize
+    from qlit.snapshot import load_thesaurus
+    from qlit.store import TermStore
+
+    store = server.RELOADER.current.store
+    rnd = Random(seed)
+    # Pick terms with some relations, to make the routes do some work
+    def having(relation):
+        return sorted(record.name for record in store.records if store.terms(getattr(record, relation)))
+    broader = rnd.choice(having('narrower'))
+    narrower = rnd.choice(having('broader'))
+    related = rnd.choice(having('related'))
+    collection = store.records[rnd.choice(store.collections)].name
+    query = ' '.join(word[:3] for word in store.records[store.find(narrower)].prefLabel.split()[:2])
+
+    th = load_thesaurus('qlit.nt')
+    homosaurus = load_homosaurus(th)
+    yield 'load.store', lambda: TermStore(th, homosaurus), None
+    # Without the response cache
+    for format, mimetype in FORMATS.items():
+        yield f'serialize.term.{format}', lambda m=mimetype: serialize(store, broader, m), None
+        yield f'serialize.thesaurus.{format}', lambda m=mimetype: serialize(store, None, m), None
+
+    client = server.app.test_client()
+    routes = {
+        '/': '/',
+        '/<name>': f'/{broader}',
+        '/api/term/<name>': f'/api/term/{broader}',
+        '/api/export': '/api/export',
+        '/api/labels': '/api/labels',
+        '/api/search?s=<query>': f'/api/search?s={query}',
+        '/api/search?s=<query>&fuzzy=1': f'/api/search?s={query}&fuzzy=1',
+        '/api/search?s=<query>&limit=10&fields=name,prefLabel': f'/api/search?s={query}&limit=10&fields=name,prefLabel',
+        '/api/collections': '/api/collections',
+        '/api/collections/<name>': f'/api/collections/{collection}',
+        '/api/collections/<name>?tree=1': f'/api/collections/{collection}?tree=1',
+        '/api/roots': '/api/roots',
+        '/api/roots?tree=1': '/api/roots?tree=1',
+        '/api/narrower?broader=<name>': f'/api/narrower?broader={broader}',
+        '/api/broader?narrower=<name>': f'/api/broader?narrower={narrower}',
+        '/api/related?other=<name>': f'/api/related?other={related}',
+        '/api/ancestors?narrower=<name>': f'/api/ancestors?narrower={narrower}',
+        '/api/descendants?broader=<name>': f'/api/descendants?broader={broader}',
+    }
+
+    def get(url):
+        response = client.get(url)
+        if response.status_code != 200:
+            raise RuntimeError(f'GET {url}: {response.status}')
+        return response.get_data()
+
+    for route, url in routes.items():
+        yield f'GET {route}', lambda url=url: get(url), None
+
+    def post(url, body):
+        response = client.post(url, json=body)
+        if response.status_code != 200:
+            raise RuntimeError(f'POST {url}: {response.status}')
+        return response.get_data()
+
+    names = [record.name for record in store.records]
+    body = dict(names=rnd.sample(names, min(1000, len(names))), expand=['broader', 'narrower'])
+    yield 'POST /api/terms', lambda: post('/api/terms', body), None
+
+
+def run(workdir: str, params: dict, jobs: int, rounds: int, only: str = None) -> dict[str, dict]:
+    log(f'Generating thesaurus in {workdir}...')
+    sources, homosaurus = generate_thesaurus(**params)
+    write_thesaurus(workdir, sources, homosaurus)
+
+    # The build and the server read their files from the environment and the working directory
+    os.environ.update(THESAURUSFILE=join(workdir, 'qlit.nt'), INDIR=join(workdir, 'ttl'))
+    os.environ.setdefault('PREWARM_CACHE', '0')
+    os.chdir(workdir)
+
+    results = dict()
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        for benchmarks in (build_benchmarks(jobs), server_benchmarks(params['seed'])):
+            for name, func, setup in benchmarks:
+                if only and not re.search(only, name):
+                    continue
+                log(f'{name}...')
+                results[name] = measure(func, setup, rounds)
+                log(f'  {results[name]["median"] * 1000:.3f} ms')
+    return results
+
+
+if __name__ == '__main__':
+    argparser = ArgumentParser(prog='python -m bench', description='Benchmark the build and the server on a synthetic thesaurus.')
+    argparser.add_argument('--size', type=int, default=1000, help='number of concepts (default: 1000)')
+    argparser.add_argument('--depth', type=int, default=5, help='maximum depth of the hierarchy (default: 5)')
+    argparser.add_argument('--labels', type=int, default=2, help='average number of altLabels per term (default: 2)')
+    argparser.add_argument('--match-ratio', type=float, default=.3, help='share of terms matching a Homosaurus term (default: .3)')
+    argparser.add_argument('--collections', type=int, default=10, help='number of collections (default: 10)')
+    argparser.add_argument('--seed', type=int, default=0, help='random seed (default: 0)')
+    argparser.add_argument('--jobs', '-j', type=int, default=1, help='number of parallel processes for parsing (default: 1)')
+    argparser.add_argument('--rounds', type=int, default=5, help='number of timed rounds per benchmark (default: 5)')
+    argparser.add_argument('--only', metavar='REGEX', help='only run benchmarks with matching names')
+    argparser.add_argument('--dir', help='generate files in DIR and keep them (default: a temporary directory)')
+    argparser.add_argument('--output', '-o', default='benchmark.json', help='results file (default: benchmark.json)')
+    argparser.add_argument('--baseline', help='compare to the results in this file')
+    argparser.add_argument('--tolerance', type=float, default=.1,
+                           help='slowdown relative to the baseline counted as a regression (default: .1)')
+    args = argparser.parse_args()
+
+    params = dict(size=args.size, depth=args.depth, labels=args.labels, match_ratio=args.match_ratio,
+                  collections=args.collections, seed=args.seed)
+    output = abspath(args.output)
+    baseline = load_results(args.baseline) if args.baseline else None
+    if baseline and baseline['params'] != params:
+        log(f'WARNING: Baseline has other parameters: {baseline["params"]}')
+
+    with TemporaryDirectory() as tmpdir:
+        workdir = abspath(args.dir) if args.dir else tmpdir
+        os.makedirs(workdir, exist_ok=True)
+        cwd = os.getcwd()
+        try:
+            results = run(workdir, params, args.jobs, args.rounds, args.only)
+        finally:
+            os.chdir(cwd)
+
+    save_results(output, params, results)
+    print(f'Wrote {output}')
+
+    if baseline:
+        rows = compare(results, baseline['results'], args.tolerance)
+        for name, before, after, ratio, regressed in rows:
+            print(f'{name:40} {before * 1000:10.3f} ms {after * 1000:10.3f} ms {ratio - 1:+8.1%}{"  SLOWER" if regressed else ""}')
+        regressions = [row for row in rows if row[4]]
+        print(f'{len(regressions)} of {len(rows)} benchmarks slower than baseline by more than {args.tolerance:.0%}')
+        if regressions:
+            sys.exit(1)
@@ -0,0 +1,117 @@
+"""
+Synthetic thesauri, shaped like the QLIT source files and Homosaurus.
+
+The same parameters and seed always give the same thesaurus.
+"""
+
+import os
+from os.path import join
+from random import Random
+from rdflib import DCTERMS, RDF, SKOS, Graph, Literal, URIRef
+from strgen import StringGenerator
+from qlit.homosaurus import HOMOSAURUS_BASE
+from qlit.identifier import PATTERN
+from qlit.thesaurus import BASE, Termset, Thesaurus
+
+SYLLABLES = ['a', 'bi', 'bå', 'da', 'de', 'e', 'fi', 'go', 'gä', 'hu', 'i', 'jo', 'ka', 'kö', 'la', 'li', 'mo',
+             'ne', 'nä', 'o', 'pe', 'quo', 'ra', 'ro', 'sa', 'sö', 'ti', 'tu', 'u', 've', 'vi', 'y', 'å', 'ö']
+
+
+def generate_thesaurus(size: int = 1000, depth: int = 5, labels: int = 2, match_ratio: float = .3,
+                       collections: int = 10, seed: int = 0) -> tuple[dict[str, Termset], Thesaurus]:
+    """Generate source terms, by identifier, and the Homosaurus terms they match.
+
+    `size` is the number of concepts, `depth` the maximum number of levels in the
+    hierarchy, `labels` the average number of alternative labels per term, and
+    `match_ratio` the share of concepts with a Homosaurus match."""
+    rnd = Random(seed)
+    idgen = StringGenerator(PATTERN, seed=seed)
+    vocabulary = sorted(set(word(rnd) for i in range(max(100, size // 2))))
+    homosaurus = Thesaurus()
+    sources = dict()
+
+    def phrase(n):
+        return ' '.join(rnd.choice(vocabulary) for i in range(n)).capitalize()
+
+    names = []
+    while len(names) < size + collections:
+        name = idgen.render()
+        if name not in sources:
+            sources[name] = Termset()
+            names.append(name)
+    concepts, collection_names = names[:size], names[size:]
+
+    # Each concept is broader to later concepts only, so there are no cycles
+    levels = dict()
+    parents = []
+    matches = []
+    roots = max(1, round(size ** (1 / max(depth, 1)))) if size else 0
+    for i, name in enumerate(concepts):
+        ref = URIRef(BASE + name)
+        t = sources[name]
+        t.add((ref, RDF.type, SKOS.Concept))
+        t.add((ref, DCTERMS.identifier, Literal(name)))
+        t.add((ref, SKOS.prefLabel, Literal(phrase(rnd.randint(1, 3)))))
+        for j in range(rnd.randint(0, 2 * labels)):
+            t.add((ref, SKOS.altLabel, Literal(phrase(rnd.randint(1, 3)))))
+        if rnd.random() < .1:
+            t.add((ref, SKOS.hiddenLabel, Literal(phrase(1))))
+        if rnd.random() < .3:
+            t.add((ref, SKOS.scopeNote, Literal(phrase(rnd.randint(5, 20)) + '.')))
+
+        broader = set()
+        if i >= roots and parents:
+            broader.add(rnd.choice(parents))
+            if rnd.random() < .05:
+                broader.add(rnd.choice(parents))
+        for other in broader:
+            t.add((ref, SKOS.broader, URIRef(BASE + other)))
+        levels[name] = max((levels[other] + 1 for other in broader), default=0)
+        if levels[name] < depth - 1:
+            parents.append(name)
+
+        if i and rnd.random() < .3:
+            other = concepts[rnd.randrange(i)]
+            if other not in broader:
+                t.add((ref, SKOS.related, URIRef(BASE + other)))
+
+        if rnd.random() < match_ratio:
+            identifier = f'homoit{len(matches):07d}'
+            match = URIRef(HOMOSAURUS_BASE + identifier)
+            matches.append(match)
+            homosaurus.add((match, RDF.type, SKOS.Concept))
+            homosaurus.add((match, DCTERMS.identifier, Literal(identifier)))
+            homosaurus.add((match, SKOS.prefLabel, Literal(phrase(rnd.randint(1, 3)))))
+            for j in range(rnd.randint(0, labels)):
+                homosaurus.add((match, SKOS.altLabel, Literal(phrase(rnd.randint(1, 3)))))
+            t.add((ref, SKOS.exactMatch if rnd.random() < .7 else SKOS.closeMatch, match))
+
+    for name in collection_names:
+        ref = URIRef(BASE + name)
+        t = sources[name]
+        t.add((ref, RDF.type, SKOS.Collection))
+        t.add((ref, DCTERMS.identifier, Literal(name)))
+        t.add((ref, SKOS.prefLabel, Literal('Tema: ' + phrase(2))))
+        for member in rnd.sample(concepts, min(len(concepts), rnd.randint(1, max(1, size // collections)))):
+            t.add((ref, SKOS.member, URIRef(BASE + member)))
+
+    return sources, homosaurus
+
+
+def word(rnd: Random) -> str:
+    return ''.join(rnd.choice(SYLLABLES) for i in range(rnd.randint(2, 4)))
+
+
+def bind_prefixes(g: Graph) -> None:
+    g.bind('dcterms', DCTERMS)
+    g.bind('skos', SKOS)
+
+
+def write_thesaurus(outdir: str, sources: dict[str, Termset], homosaurus: Thesaurus) -> None:
+    """Write source files to `outdir/ttl`, and Homosaurus terms to `outdir/homosaurus.ttl`."""
+    os.makedirs(join(outdir, 'ttl'), exist_ok=True)
+    for name, termset in sources.items():
+        bind_prefixes(termset)
+        termset.serialize(join(outdir, 'ttl', f'{name}.ttl'), format='turtle', base=URIRef(BASE))
+    bind_prefixes(homosaurus)
+    homosaurus.serialize(join(outdir, 'homosaurus.ttl'), format='turtle')
@@ -0,0 +1,133 @@
+"""
+Measure the memory of gunicorn workers, with and without preloading the app.
+
+For each mode, gunicorn is started with the config in this repo, some requests
+are made, and the memory of the master and each worker is read from
+/proc/<pid>/smaps_rollup (Linux only):
+
+- USS (unique set size): memory used only by that process
+- PSS (proportional set size): unique memory plus a share of the shared memory
+- RSS (resident set size): all memory in use by the process, shared or not
+
+The sum of PSS over all processes is what the server uses in total.
+
+    python -m bench.memory --workers 4 --output memory.json
+"""
+
+from argparse import ArgumentParser
+import json
+import os
+from os.path import abspath, join
+import subprocess
+import sys
+from time import sleep
+from .serving import ROOT, free_port, get
+from .timing import environment
+
+MODES = {
+    'preload': '1',
+    'no-preload': '0',
+}
+
+
+def read_memory(pid: int) -> dict:
+    """Memory of a process, in kB."""
+    fields = dict()
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            name, _, value = line.partition(':')
+            if value.strip().endswith('kB'):
+                fields[name] = int(value.split()[0])
+    return dict(
+        rss=fields['Rss'],
+        pss=fields['Pss'],
+        uss=fields['Private_Clean'] + fields['Private_Dirty'],
+    )
+
+
+def children(pid: int) -> list[int]:
+    found = []
+    for name in os.listdir('/proc'):
+        if name.isdigit():
+            try:
+                with open(f'/proc/{name}/stat') as f:
+                    # The fields after the parenthesized command name are: state, ppid, ...
+                    ppid = int(f.read().rpartition(')')[2].split()[1])
+            except OSError:
+                continue
+            if ppid == pid:
+                found.append(int(name))
+    return sorted(found)
+
+
+def wait_until_stable(pids: list[int], timeout: float = 300) -> None:
+    """Wait until memory stops growing, as workers may still be loading."""
+    previous = None
+    for i in range(int(timeout / .5)):
+        current = [read_memory(pid)['pss'] for pid in pids]
+        if current == previous:
+            return
+        previous = current
+        sleep(.5)
+
+
+def measure_mode(mode: str, workdir: str, workers: int, requests: int) -> dict:
+    port = free_port()
+    env = dict(os.environ, PYTHONPATH=ROOT, PRELOAD=MODES[mode], WEB_CONCURRENCY=str(workers),
+               GUNICORN_BIND=f'127.0.0.1:{port}')
+    command = ['gunicorn', '--config', join(ROOT, 'gunicorn.conf.py')]
+    server = subprocess.Popen(command, cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        for i in range(1200):
+            if server.poll() is not None:
+                raise RuntimeError(f'gunicorn exited with {server.returncode}')
+            if len(children(server.pid)) == workers:
+                try:
+                    labels = json.loads(get(port, '/api/labels'))
+                    break
+                except (OSError, RuntimeError):
+                    pass
+            sleep(.1)
+        else:
+            raise RuntimeError('gunicorn did not start')
+        pids = children(server.pid)
+        wait_until_stable(pids)
+
+        # Use the workers a bit, like in production
+        names = sorted(labels)
+        for i in range(requests):
+            name = names[i * 7919 % len(names)]
+            get(port, f'/api/term/{name}')
+            get(port, f'/api/narrower?broader={name}')
+            get(port, f'/{name}')
+        wait_until_stable(pids)
+
+        result = dict(master=read_memory(server.pid), workers=[read_memory(pid) for pid in pids])
+    finally:
+        server.terminate()
+        server.wait()
+    result['total_pss'] = result['master']['pss'] + sum(worker['pss'] for worker in result['workers'])
+    result['mean_worker_uss'] = sum(worker['uss'] for worker in result['workers']) / workers
+    return result
+
+
+if __name__ == '__main__':
+    argparser = ArgumentParser(prog='python -m bench.memory', description='Measure memory of gunicorn workers.')
+    argparser.add_argument('--dir', default='.', help='directory with qlit.nt and homosaurus.ttl (default: current)')
+    argparser.add_argument('--modes', default='preload,no-preload', help='modes to compare (default: preload,no-preload)')
+    argparser.add_argument('--workers', type=int, default=4, help='number of workers (default: 4)')
+    argparser.add_argument('--requests', type=int, default=100, help='rounds of requests before measuring (default: 100)')
+    argparser.add_argument('--output', '-o', default='memory.json', help='results file (default: memory.json)')
+    args = argparser.parse_args()
+
+    results = dict()
+    for mode in args.modes.split(','):
+        print(f'Starting gunicorn ({mode}, {args.workers} workers)...', file=sys.stderr)
+        results[mode] = result = measure_mode(mode, abspath(args.dir), args.workers, args.requests)
+        worker_uss = ', '.join(f'{worker["uss"] / 1024:.1f}' for worker in result['workers'])
+        print(f'{mode}: total PSS {result["total_pss"] / 1024:.1f} MB, '
+              f'master USS {result["master"]["uss"] / 1024:.1f} MB, worker USS {worker_uss} MB')
+
+    with open(args.output, 'w') as f:
+        json.dump(dict(environment=environment(), params=vars(args), results=results), f, indent=2)
+    print(f'Wrote {args.output}')
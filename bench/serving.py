@@ -0,0 +1,143 @@
+"""
+Compare serving modes under load: WSGI (gunicorn) and ASGI (uvicorn).
+
+Each server is started on the thesaurus files in a directory (by default the
+current one), with the response cache disabled so that every RDF request is
+serialized. Some clients keep requesting the full RDF dump, while others make
+cheap API lookups, and the latencies of each kind are saved as JSON.
+
+    python -m bench --size 10000 --dir /tmp/bench --only none
+    python -m bench.serving --dir /tmp/bench --output serving.json
+"""
+
+from argparse import ArgumentParser
+from http.client import HTTPConnection
+import json
+import os
+from os.path import abspath, dirname
+from random import Random
+import socket
+import subprocess
+from statistics import median, quantiles
+import sys
+from threading import Thread
+from time import perf_counter, sleep
+from urllib.parse import quote
+from .timing import environment
+
+ROOT = dirname(dirname(abspath(__file__)))
+
+SERVERS = {
+    'wsgi': ['gunicorn', '--workers', '1', '--bind', '127.0.0.1:{port}', 'wsgi:app'],
+    'asgi': ['uvicorn', '--workers', '1', '--host', '127.0.0.1', '--port', '{port}', 'asgi:app'],
+}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def get(port: int, url: str) -> bytes:
+    connection = HTTPConnection('127.0.0.1', port, timeout=300)
+    try:
+        connection.request('GET', url)
+        response = connection.getresponse()
+        data = response.read()
+        if response.status != 200:
+            raise RuntimeError(f'GET {url}: {response.status}')
+        return data
+    finally:
+        connection.close()
+
+
+def start_server(mode: str, workdir: str, port: int) -> subprocess.Popen:
+    command = [arg.format(port=port) for arg in SERVERS[mode]]
+    env = dict(os.environ, PYTHONPATH=ROOT, PREWARM_CACHE='0', RESPONSE_CACHE_SIZE='0')
+    server = subprocess.Popen(command, cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    # Wait until the thesaurus is loaded
+    for i in range(600):
+        if server.poll() is not None:
+            raise RuntimeError(f'{" ".join(command)} exited with {server.returncode}')
+        try:
+            get(port, '/api/collections')
+            return server
+        except (OSError, RuntimeError):
+            sleep(.1)
+    server.terminate()
+    raise RuntimeError(f'{" ".join(command)} did not start')
+
+
+def summarize(latencies: list[float], duration: float) -> dict:
+    if not latencies:
+        return dict(requests=0)
+    return dict(
+        requests=len(latencies),
+        per_second=len(latencies) / duration,
+        median=median(latencies),
+        p95=quantiles(latencies, n=20)[-1] if len(latencies) > 1 else latencies[0],
+        max=max(latencies),
+    )
+
+
+def load(port: int, light_urls: list[str], heavy_urls: list[str], light_clients: int, heavy_clients: int,
+         duration: float) -> dict:
+    """Run clients for a while, and summarize the latencies of light and heavy requests."""
+    latencies = dict(light=[], heavy=[])
+    end = perf_counter() + duration
+
+    def client(kind, urls, seed):
+        rnd = Random(seed)
+        while perf_counter() < end:
+            start = perf_counter()
+            get(port, rnd.choice(urls))
+            latencies[kind].append(perf_counter() - start)
+
+    threads = [Thread(target=client, args=('heavy', heavy_urls, i)) for i in range(heavy_clients)]
+    threads += [Thread(target=client, args=('light', light_urls, i)) for i in range(light_clients)]
+    start = perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = perf_counter() - start
+    return dict((kind, summarize(values, elapsed)) for kind, values in latencies.items())
+
+
+if __name__ == '__main__':
+    argparser = ArgumentParser(prog='python -m bench.serving', description='Compare WSGI and ASGI serving under load.')
+    argparser.add_argument('--dir', default='.', help='directory with qlit.nt and homosaurus.ttl (default: current)')
+    argparser.add_argument('--modes', default='wsgi,asgi', help='serving modes to compare (default: wsgi,asgi)')
+    argparser.add_argument('--light', type=int, default=4, help='number of clients making API lookups (default: 4)')
+    argparser.add_argument('--heavy', type=int, default=2, help='number of clients requesting the RDF dump (default: 2)')
+    argparser.add_argument('--duration', type=float, default=20, help='seconds of load per mode (default: 20)')
+    argparser.add_argument('--seed', type=int, default=0, help='random seed for choosing terms (default: 0)')
+    argparser.add_argument('--output', '-o', default='serving.json', help='results file (default: serving.json)')
+    args = argparser.parse_args()
+
+    workdir = abspath(args.dir)
+    results = dict()
+    for mode in args.modes.split(','):
+        port = free_port()
+        print(f'Starting {mode} server...', file=sys.stderr)
+        server = start_server(mode, workdir, port)
+        try:
+            labels = json.loads(get(port, '/api/labels'))
+            rnd = Random(args.seed)
+            sample = rnd.sample(sorted(labels), min(len(labels), 100))
+            light_urls = [f'/api/term/{name}' for name in sample]
+            light_urls += [f'/api/search?s={quote(labels[name][:3])}' for name in sample]
+            heavy_urls = ['/', '/?format=jsonld']
+            results[mode] = load(port, light_urls, heavy_urls, args.light, args.heavy, args.duration)
+        finally:
+            server.terminate()
+            server.wait()
+        for kind, summary in results[mode].items():
+            if summary['requests']:
+                print(f'{mode} {kind:5}: {summary["requests"]:6} requests, {summary["per_second"]:8.1f}/s, '
+                      f'median {summary["median"] * 1000:8.1f} ms, p95 {summary["p95"] * 1000:8.1f} ms')
+
+    with open(args.output, 'w') as f:
+        json.dump(dict(environment=environment(), params=vars(args), results=results), f, indent=2)
+    print(f'Wrote {args.output}')
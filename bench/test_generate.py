@@ -0,0 +1,43 @@
+from rdflib import SKOS
+from qlit.identifier import validate_identifier
+from qlit.skos import skos_validate_graph
+from qlit.thesaurus import Thesaurus
+from .generate import generate_thesaurus
+from .timing import compare, measure
+
+def test_generate_thesaurus():
+    sources, homosaurus = generate_thesaurus(200, depth=3, match_ratio=.5, collections=4, seed=1)
+    assert len(sources) == 204
+    assert all(validate_identifier(name) for name in sources)
+
+    t = Thesaurus()
+    for termset in sources.values():
+        t += termset
+    assert len(t.concepts()) == 200
+    assert len(t.collections()) == 4
+    assert list(skos_validate_graph(t)) == []
+    # No deeper than allowed
+    def depth(ref):
+        return 1 + max((depth(parent) for parent in t.objects(ref, SKOS.broader)), default=0)
+    assert max(depth(ref) for ref in t.concepts()) == 3
+    # Matches resolve to Homosaurus terms
+    matches = set(t.objects(None, SKOS.exactMatch)) | set(t.objects(None, SKOS.closeMatch))
+    assert 50 < len(matches) < 150
+    assert matches == set(homosaurus.concepts())
+
+    # Same seed, same thesaurus
+    sources2, homosaurus2 = generate_thesaurus(200, depth=3, match_ratio=.5, collections=4, seed=1)
+    assert list(sources2) == list(sources)
+    assert all(set(sources2[name]) == set(sources[name]) for name in sources)
+
+def test_measure():
+    calls = []
+    result = measure(lambda x: calls.append(x), lambda: (1,), rounds=3)
+    assert result["calls"] == 1
+    assert len(result["times"]) == 3
+    assert calls == [1, 1, 1, 1]
+
+def test_compare():
+    baseline = {"a": {"median": 1.0}, "b": {"median": 1.0}}
+    results = {"a": {"median": 1.05}, "b": {"median": 1.5}, "c": {"median": 1.0}}
+    assert compare(results, baseline, .1) == [("a", 1.0, 1.05, 1.05, False), ("b", 1.0, 1.5, 1.5, True)]
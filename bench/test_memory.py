@@ -0,0 +1,16 @@
+import os
+import subprocess
+import sys
+from .memory import children, read_memory
+
+def test_read_memory():
+    memory = read_memory(os.getpid())
+    assert 0 < memory["uss"] <= memory["pss"] <= memory["rss"]
+
+def test_children():
+    child = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(10)"])
+    try:
+        assert child.pid in children(os.getpid())
+    finally:
+        child.kill()
+        child.wait()
@@ -0,0 +1,72 @@
+"""
+Timing of benchmarks, and comparison of results.
+"""
+
+from datetime import datetime, timezone
+import json
+import os
+import platform
+from statistics import median
+from time import perf_counter
+from typing import Callable
+import rdflib
+
+# Run quick functions repeatedly, for at least this long in each round.
+MIN_ROUND_TIME = .2
+
+
+def measure(func: Callable, setup: Callable = None, rounds: int = 5) -> dict:
+    """Time a function, in seconds per call.
+
+    With `setup`, the function is called once per round, with the arguments
+    returned by `setup` if any, and `setup` is not timed. Otherwise, it is called
+    as many times as fit in `MIN_ROUND_TIME`. A first, untimed call warms up
+    caches."""
+    args = (setup() or ()) if setup else ()
+    start = perf_counter()
+    func(*args)
+    calls = 1 if setup else max(1, int(MIN_ROUND_TIME / max(perf_counter() - start, 1e-9)))
+
+    times = []
+    for i in range(rounds):
+        args = (setup() or ()) if setup else ()
+        start = perf_counter()
+        for j in range(calls):
+            func(*args)
+        times.append((perf_counter() - start) / calls)
+    return dict(calls=calls, rounds=rounds, min=min(times), median=median(times), times=times)
+
+
+def environment() -> dict:
+    return dict(
+        python=platform.python_version(),
+        rdflib=rdflib.__version__,
+        platform=platform.platform(),
+        cpus=os.cpu_count(),
+    )
+
+
+def save_results(path: str, params: dict, results: dict[str, dict]) -> None:
+    data = dict(
+        created=datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        environment=environment(),
+        params=params,
+        results=results,
+    )
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2)
+
+
+def load_results(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(results: dict[str, dict], baseline: dict[str, dict], tolerance: float = .1) -> list[tuple]:
+    """Compare median times to a baseline, as (name, baseline, current, ratio, regressed) per benchmark."""
+    rows = []
+    for name, result in results.items():
+        if name in baseline:
+            ratio = result['median'] / baseline[name]['median']
+            rows.append((name, baseline[name]['median'], result['median'], ratio, ratio > 1 + tolerance))
+    return rows
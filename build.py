@@ -1,14 +1,28 @@
+from argparse import ArgumentParser
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timezone
-from itertools import filterfalse
+from hashlib import blake2b, sha256
+from io import BytesIO
+from itertools import filterfalse, islice
+import json
 import os
 from os.path import join
+import pickle
 import re
+from time import sleep
+from typing import Iterable, Iterator
 from dotenv import load_dotenv
-from rdflib import DCTERMS, SKOS, XSD, Literal
+import rdflib
+from rdflib import DCTERMS, RDF, SKOS, XSD, Literal, URIRef
+from rdflib.plugins.parsers.ntriples import W3CNTriplesParser
+from qlit.homosaurus import HOMOSAURUS_FILE, SUBSET_FILE, is_current, write_subset
 from qlit.identifier import generate_identifier, validate_identifier
 from qlit.simple import name_to_ref, ref_to_name
-from qlit.thesaurus import Termset, Thesaurus
-from qlit.skos import skos_validate_partial, skos_validate_graph, skos_complete_graph
+from qlit.thesaurus import TERM_TYPES, Termset, Thesaurus
+from qlit.ntriples import nt_line, write_sorted
+from qlit.snapshot import RecordingThesaurus, file_hash, has_snapshot, load_thesaurus, save_snapshot
+from qlit.skos import skos_validate_partial, skos_validate_graph, skos_warn_graph, skos_complete_graph
 from qlit.qlit import qlit_validate_partial
 
 load_dotenv()
@@ -21,9 +35,16 @@ INDIR = os.environ.get('INDIR')
 if not INDIR:
     raise EnvironmentError('Error: INDIR missing from env')
 
-rdf_now = Literal(
-    datetime.now(timezone.utc).isoformat().split('.')[0],
-    datatype=XSD.dateTime)
+CACHEFILE = os.environ.get('CACHEFILE', '.buildcache')
+
+# Increment when parsing or validation of single files changes, to invalidate the cache.
+CACHE_VERSION = 1
+
+
+def rdf_now() -> Literal:
+    return Literal(
+        datetime.now(timezone.utc).isoformat().split('.')[0],
+        datatype=XSD.dateTime)
 
 P_TRACKED = [SKOS.altLabel, SKOS.broader, SKOS.broadMatch, SKOS.exactMatch, SKOS.narrower, SKOS.prefLabel, SKOS.related, SKOS.scopeNote]
 
@@ -53,81 +74,277 @@ def replace_identifier(thesaurus: Thesaurus, old_id: str, new_id: str):
     thesaurus.set((new_ref, DCTERMS.identifier, Literal(new_id)))
 
 
-def check_changes(thesaurus: Thesaurus, thesaurus_prev: Thesaurus):
-    uris = thesaurus.refs()
-    uris_prev = thesaurus_prev.refs()
+# Bytes per digest of the objects of a tracked predicate
+DIGEST_SIZE = 8
+
+
+def objects_digest(objects: list[str]) -> bytes:
+    """A digest of the N-Triples forms of some objects, regardless of their order."""
+    return blake2b('\n'.join(sorted(objects)).encode('utf-8'), digest_size=DIGEST_SIZE).digest()
+
+
+class TermFingerprint:
+    """What is needed about a version of a term, to detect changes in it."""
+    __slots__ = ('ref', 'tracked', 'issued', 'modified')
+
+    def __init__(self, ref: URIRef):
+        self.ref = ref
+        # Digests of the objects of each tracked predicate, in the order of P_TRACKED
+        self.tracked = b''
+        self.issued = None
+        self.modified = None
+
+    def digest(self, i: int) -> bytes:
+        """The digest for the `i`th tracked predicate."""
+        return self.tracked[i * DIGEST_SIZE:(i + 1) * DIGEST_SIZE]
+
+    def changed(self, other: 'TermFingerprint') -> list[URIRef]:
+        """The tracked predicates that have other objects than in another version of the term."""
+        return [p for i, p in enumerate(P_TRACKED) if self.digest(i) != other.digest(i)]
+
+
+class FingerprintSink:
+    """Fingerprints terms from a stream of triples, sorted by subject as in sorted N-Triples.
+
+    Fingerprints are collected as each subject ends, to be taken with `take`."""
+
+    def __init__(self):
+        self.fingerprints: list[TermFingerprint] = []
+        self.subject = None
+        self.key = None
+        self.is_term = False
+        self.objects: dict[URIRef, list[str]] = defaultdict(list)
+        self.dates = dict()
+
+    def triple(self, s, p, o):
+        if s != self.subject:
+            self.finish_subject()
+            # A subject that comes back would be fingerprinted twice, and break the merge in `check_changes`.
+            key = s.n3()
+            if self.key is not None and key <= self.key:
+                raise ValueError(f'Triples are not sorted by subject: {key} after {self.key}')
+            self.subject = s
+            self.key = key
+        if p in P_TRACKED:
+            self.objects[p].append(o.n3())
+        elif p == DCTERMS.issued or p == DCTERMS.modified:
+            self.dates[p] = o
+        elif p == RDF.type and o in TERM_TYPES:
+            self.is_term = True
+
+    def finish_subject(self):
+        """Keep a fingerprint of the current subject if it is a term, and forget the rest."""
+        if self.is_term:
+            fingerprint = TermFingerprint(self.subject)
+            fingerprint.tracked = b''.join(objects_digest(self.objects.get(p, ())) for p in P_TRACKED)
+            fingerprint.issued = self.dates.get(DCTERMS.issued)
+            fingerprint.modified = self.dates.get(DCTERMS.modified)
+            self.fingerprints.append(fingerprint)
+        self.is_term = False
+        self.objects.clear()
+        self.dates.clear()
+
+    def take(self) -> list[TermFingerprint]:
+        """The fingerprints collected since the last call."""
+        fingerprints = self.fingerprints
+        self.fingerprints = []
+        return fingerprints
+
+
+def read_fingerprints(path: str, batch_lines: int = 10_000) -> Iterator[TermFingerprint]:
+    """Fingerprint the terms in a sorted N-Triples file, in order, reading it a batch of lines at a time."""
+    sink = FingerprintSink()
+    parser = W3CNTriplesParser(sink)
+    with open(path, 'rb') as f:
+        while batch := b''.join(islice(f, batch_lines)):
+            parser.parse(BytesIO(batch))
+            yield from sink.take()
+    sink.finish_subject()
+    yield from sink.take()
+
+
+def term_key(ref: URIRef) -> str:
+    """Terms sorted by this are in the order of sorted N-Triples."""
+    return ref.n3()
+
+
+def graph_fingerprints(thesaurus: Thesaurus, scope: Iterable[URIRef] = None) -> list[TermFingerprint]:
+    """Fingerprint the terms in a thesaurus, or only those in a scope, in the order of sorted N-Triples."""
+    refs = thesaurus.refs() if scope is None else [ref for ref in scope if thesaurus.has_term(ref)]
+    sink = FingerprintSink()
+    for s in sorted(refs, key=term_key):
+        for p, o in thesaurus.predicate_objects(s):
+            sink.triple(s, p, o)
+    sink.finish_subject()
+    return sink.take()
 
-    count_new = 0
-    count_changed = 0
-    count_removed = len(list(uri for uri in uris_prev if uri not in uris))
 
-    for term_uri in uris:
+def check_changes(thesaurus: Thesaurus, fingerprints_prev: Iterable[TermFingerprint],
+                  scope: set[URIRef] = None) -> dict:
+    """Set issued and modified dates, and list new, changed and removed terms.
+
+    The previous fingerprints must be in the order of sorted N-Triples, as from
+    `read_fingerprints`. They are merged with those of the thesaurus, one at a time.
+    If a `scope` of terms is given, only those are checked, and the previous
+    fingerprints should only be of those."""
+    now = rdf_now()
+    changes = dict(
+        new=[],
+        changed=dict(),
+        removed=[],
+    )
+    prevs = iter(fingerprints_prev)
+    prev = next(prevs, None)
+
+    for fingerprint in graph_fingerprints(thesaurus, scope):
+        term_uri = fingerprint.ref
         try:
-            if term_uri not in uris_prev:
+            # Previous terms before this one are removed.
+            while prev and term_key(prev.ref) < term_key(term_uri):
+                changes['removed'].append(ref_to_name(prev.ref))
+                prev = next(prevs, None)
+            if not prev or prev.ref != term_uri:
                 # This term is a new addition.
-                thesaurus.set((term_uri, DCTERMS.issued, rdf_now))
-                thesaurus.set((term_uri, DCTERMS.modified, rdf_now))
-                count_new += 1
+                thesaurus.set((term_uri, DCTERMS.issued, now))
+                thesaurus.set((term_uri, DCTERMS.modified, now))
+                changes['new'].append(ref_to_name(term_uri))
+                continue
+            # Are there any changes in the term?
+            changed_ps = fingerprint.changed(prev)
+            if (changed_ps):
+                # The term has changes.
+                p_names = [re.sub(r'.*[/#]', '', p) for p in changed_ps]
+                print(f'Changes for {ref_to_name(term_uri)} in {", ".join(p_names)}')
+                thesaurus.set((term_uri, DCTERMS.modified, now))
+                changes['changed'][ref_to_name(term_uri)] = p_names
             else:
-                # Are there any changes in the term?
-                changed_ps = []
-                for p in P_TRACKED:
-                    a = sorted(thesaurus.objects(term_uri, p))
-                    b = sorted(thesaurus_prev.objects(term_uri, p))
-                    if a != b:
-                        changed_ps.append(p)
-                if (changed_ps):
-                    # The term has changes.
-                    p_names = [re.sub(r'.*[/#]', '', p) for p in changed_ps]
-                    print(f'Changes for {ref_to_name(term_uri)} in {", ".join(p_names)}')
-                    thesaurus.set((term_uri, DCTERMS.modified, rdf_now))
-                    count_changed += 1
-                else:
-                    # No changes. Copy old dates.
-                    thesaurus.set((term_uri, DCTERMS.issued, thesaurus_prev.value(term_uri, DCTERMS.issued)))
-                    thesaurus.set((term_uri, DCTERMS.modified, thesaurus_prev.value(term_uri, DCTERMS.modified)))
+                # No changes. Copy old dates.
+                thesaurus.set((term_uri, DCTERMS.issued, prev.issued))
+                thesaurus.set((term_uri, DCTERMS.modified, prev.modified))
+            prev = next(prevs, None)
         except Exception as e:
             # On any error, re-raise it after mentioning the faulty term uri
             print(f'\nError when checking changes for {term_uri}:')
             raise e
-    return count_changed, count_new, count_removed
+
+    # The rest of the previous terms are after the last term, and removed.
+    while prev:
+        changes['removed'].append(ref_to_name(prev.ref))
+        prev = next(prevs, None)
+    return changes
+
+
+def report_changes(changes: dict, changesfile: str = None) -> None:
+    print(f'{len(changes["changed"])} changed, {len(changes["new"])} new, {len(changes["removed"])} removed')
+    if changesfile:
+        with open(changesfile, 'w') as f:
+            json.dump(changes, f, indent=2)
+        print(f'Wrote {changesfile}')
 
 
 def is_infile(fn):
     return re.match(r'[^-_.]+\.ttl', fn, re.IGNORECASE)
 
 
-if __name__ == '__main__':
-    # Load current state.
-    thesaurus = Thesaurus()
+def list_infiles(indirs: list[str]) -> list[str]:
+    return [join(indir, fn) for indir in indirs for fn in os.listdir(indir) if is_infile(fn)]
 
-    # Prepare parsing.
-    indirs = INDIR.split(":")
-    for indir in indirs:
-        print(f'Reading files from {indir}')
-    fns = [join(indir, fn) for indir in indirs for fn in os.listdir(indir) if is_infile(fn)]
-    print(f'Parsing {len(fns)} files...')
-    skipped = []
 
-    # Parse input files.
+def parse_data(data: bytes) -> tuple[list, str | None]:
+    """Parse and validate the contents of a source file, returning its triples or an error message."""
+    try:
+        termset = Termset().parse(data=data.decode('utf-8'))
+        for error in skos_validate_partial(termset):
+            raise SyntaxError(error)
+        for error in qlit_validate_partial(termset):
+            raise SyntaxError(error)
+        return list(termset), None
+    except Exception as err:
+        return [], f'{type(err)} {err}'
+
+
+def load_cache(path: str) -> dict:
+    """Load parse results of earlier builds, keyed by file content hash."""
+    try:
+        with open(path, 'rb') as f:
+            version, cache = pickle.load(f)
+        if version == (CACHE_VERSION, rdflib.__version__):
+            return cache
+    except Exception:
+        # Missing or unreadable, just start over.
+        pass
+    return dict()
+
+
+def save_cache(path: str, cache: dict) -> None:
+    with open(path + '.tmp', 'wb') as f:
+        pickle.dump(((CACHE_VERSION, rdflib.__version__), cache), f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(path + '.tmp', path)
+
+
+def read_files(fns: list[str], jobs: int, cache: dict) -> list[str]:
+    """Parse source files in parallel into the cache, and return the hash of each.
+
+    Files with contents found in the cache are not parsed again. The cache is
+    updated in place, and pruned to the given files."""
+    contents = dict()
+    hashes = []
     for fn in fns:
-        try:
-            with open(fn) as f:
-                data = f.read()
-            termset = Termset().parse(data=data)
-            for error in skos_validate_partial(termset):
-                raise SyntaxError(error)
-            for error in qlit_validate_partial(termset):
-                raise SyntaxError(error)
-            thesaurus += termset
-        except Exception as err:
+        with open(fn, 'rb') as f:
+            data = f.read()
+        digest = sha256(data).hexdigest()
+        hashes.append(digest)
+        if digest not in cache:
+            contents[digest] = data
+    print(f'Parsing {len(contents)} new or changed files, {len(fns) - len(contents)} from cache')
+
+    if jobs > 1 and len(contents) > 1:
+        with ProcessPoolExecutor(jobs) as executor:
+            results = list(executor.map(parse_data, contents.values(), chunksize=16))
+    else:
+        results = map(parse_data, contents.values())
+    cache.update(zip(contents.keys(), results))
+    for digest in set(cache) - set(hashes):
+        del cache[digest]
+    return hashes
+
+
+def parse_files(fns: list[str], jobs: int, cache: dict) -> tuple[Thesaurus, list[str], dict[URIRef, str]]:
+    """Parse source files, using and updating the cache, and merge them, in order, into a thesaurus.
+
+    Also returns the skipped files, and the file where each term is described."""
+    hashes = read_files(fns, jobs, cache)
+    thesaurus = Thesaurus()
+    skipped = []
+    locations = dict()
+    for fn, digest in zip(fns, hashes):
+        triples, error = cache[digest]
+        if error:
             # Report error and skip this input file.
-            print(f'{fn}: {type(err)} {err}')
+            print(f'{fn}: {error}')
             skipped.append(fn)
+        else:
+            thesaurus += triples
+            locations.update((s, fn) for s, p, o in triples)
+    return thesaurus, skipped, locations
+
+
+def build(fns: list[str], jobs: int, cache: dict, fingerprints_prev: Iterable[TermFingerprint],
+          changesfile: str = None) -> Thesaurus:
+    """Compile source files to a thesaurus and write it."""
+    print(f'Found {len(fns)} files...')
+
+    # Parse input files.
+    thesaurus, skipped, locations = parse_files(fns, jobs, cache)
 
     # Check for thesaurus-wide errors.
-    for error in skos_validate_graph(thesaurus):
-        raise SyntaxError(error)
+    errors = list(skos_validate_graph(thesaurus, locations))
+    for error in errors:
+        print(error)
+    if errors:
+        raise SyntaxError(f'Found {len(errors)} errors in the thesaurus')
+    for warning in skos_warn_graph(thesaurus, locations):
+        print(f'WARNING: {warning}')
 
     # Done parsing.
     if skipped:
@@ -142,18 +359,238 @@ if __name__ == '__main__':
     print('Completing relations...')
     skos_complete_graph(thesaurus)
 
-    # Load another copy to track changes.
+    # Compare to the previous state to track changes.
     print('Checking changes...')
-    thesaurus_prev = Thesaurus().parse(THESAURUSFILE)
-    count_changed, count_new, count_removed = check_changes(thesaurus, thesaurus_prev)
-    print(f'{count_changed} changed, {count_new} new, {count_removed} removed')
+    changes = check_changes(thesaurus, fingerprints_prev)
+    report_changes(changes, changesfile)
 
     # Write result.
     terms = thesaurus.refs()
     print(f'Writing {len(terms)} terms...')
-    thesaurus.base = None
-    nt_data = thesaurus.serialize(format='nt')
-    nt_lines = sorted(nt_data.splitlines(True))
-    with open(THESAURUSFILE, 'w') as f:
-        f.writelines(nt_lines)
+    write_sorted(thesaurus, THESAURUSFILE)
     print(f'Wrote {THESAURUSFILE}')
+    return thesaurus
+
+
+# Relations that completion mirrors, so that they also change the terms they point to
+P_MIRRORED = [SKOS.broader, SKOS.narrower, SKOS.related, DCTERMS.replaces, DCTERMS.isReplacedBy]
+
+
+def affected_terms(triples: list) -> set[URIRef]:
+    """The terms that some source triples may change, after completion."""
+    return set(s for s, p, o in triples) | set(o for s, p, o in triples if p in P_MIRRORED)
+
+
+def complete_terms(source: Thesaurus, scope: set[URIRef]) -> Thesaurus:
+    """Complete some terms, from what the source says about them and what relates to them.
+
+    Only the triples of the terms in the scope are complete in the result."""
+    g = Thesaurus()
+    for term in scope:
+        g += source.triples((term, None, None))
+        for p in P_MIRRORED:
+            for other in source.subjects(p, term):
+                g.add((other, p, term))
+                # Completion only mirrors relations of concepts
+                g += source.triples((other, RDF.type, None))
+    skos_complete_graph(g)
+    return g
+
+
+class IncrementalBuild:
+    """A build kept in memory, to rebuild quickly when source files change.
+
+    Keeps the merged triples of the source files, with how many files state each
+    triple, and the completed thesaurus. When files change, their old triples are
+    swapped for the new ones. Then only the terms that they describe or relate to
+    are validated, completed and checked for changes, and replaced in the thesaurus."""
+
+    def __init__(self, fns: list[str], jobs: int, cache: dict, thesaurus: Thesaurus):
+        """Start from a full build of the files, with their parse results in the cache."""
+        self.jobs = jobs
+        self.cache = cache
+        self.thesaurus = thesaurus
+        self.fingerprints = dict((fingerprint.ref, fingerprint) for fingerprint in graph_fingerprints(thesaurus))
+        self.source = Thesaurus()
+        self.counts: Counter = Counter()
+        # The hash and triples of each file, and the file where each term is described
+        self.files: dict[str, tuple[str, list]] = dict()
+        self.locations: dict[URIRef, str] = dict()
+        # Terms to rebuild, kept until a rebuild succeeds
+        self.pending: set[URIRef] = set()
+        self.swap(fns)
+        self.pending.clear()
+
+    def swap(self, fns: list[str]) -> None:
+        """Swap in the triples of new and changed files, and swap out those of removed files."""
+        hashes = dict(zip(fns, read_files(fns, self.jobs, self.cache)))
+        for fn in set(self.files) - set(hashes):
+            self.swap_file(fn, [])
+            del self.files[fn]
+        for fn, digest in hashes.items():
+            if fn in self.files and self.files[fn][0] == digest:
+                continue
+            triples, error = self.cache[digest]
+            if error:
+                # Report error and skip this input file.
+                print(f'{fn}: {error}')
+            self.swap_file(fn, triples)
+            self.files[fn] = (digest, triples)
+
+    def swap_file(self, fn: str, triples: list) -> None:
+        _, old = self.files.get(fn, (None, []))
+        self.pending |= affected_terms(old) | affected_terms(triples)
+        for triple in old:
+            self.counts[triple] -= 1
+            if not self.counts[triple]:
+                del self.counts[triple]
+                self.source.remove(triple)
+        for s in set(s for s, p, o in old):
+            if self.locations.get(s) == fn:
+                del self.locations[s]
+        added = []
+        for triple in triples:
+            self.counts[triple] += 1
+            if self.counts[triple] == 1:
+                added.append(triple)
+        self.source.addN((s, p, o, self.source) for s, p, o in added)
+        self.locations.update((s, fn) for s, p, o in triples)
+
+    def update(self, fns: list[str], changesfile: str = None) -> bool:
+        """Rebuild the terms affected by changed source files, and write the thesaurus.
+
+        Returns False without rebuilding, if a full build is needed instead."""
+        self.swap(fns)
+        # A full build gives new identifiers to terms with invalid ones, and changes the terms relating to them.
+        if not all(validate_identifier(self.source.value(ref, DCTERMS.identifier)) for ref in self.source.refs()):
+            return False
+        scope = self.pending - {self.thesaurus.scheme}
+        if not scope:
+            print('No changes in source files')
+            return True
+        print(f'Rebuilding {len(scope)} affected terms...')
+
+        # Check for errors involving these terms.
+        errors = list(skos_validate_graph(self.source, self.locations, scope))
+        for error in errors:
+            print(error)
+        if errors:
+            raise SyntaxError(f'Found {len(errors)} errors in the thesaurus')
+        for warning in skos_warn_graph(self.source, self.locations, scope):
+            print(f'WARNING: {warning}')
+
+        # Replace the terms in the thesaurus with their completed triples.
+        completed = complete_terms(self.source, scope)
+        scheme = self.thesaurus.scheme
+        for term in scope:
+            self.thesaurus.remove((term, None, None))
+            self.thesaurus.remove((scheme, SKOS.hasTopConcept, term))
+        self.thesaurus.addN((s, p, o, self.thesaurus) for term in scope for s, p, o in completed.triples((term, None, None)))
+        self.thesaurus.addN((scheme, SKOS.hasTopConcept, term, self.thesaurus) for term in scope
+                            if (scheme, SKOS.hasTopConcept, term) in completed)
+
+        print('Checking changes...')
+        fingerprints_prev = sorted((self.fingerprints[ref] for ref in scope if ref in self.fingerprints),
+                                   key=lambda fingerprint: term_key(fingerprint.ref))
+        changes = check_changes(self.thesaurus, fingerprints_prev, scope)
+        report_changes(changes, changesfile)
+        for ref in scope:
+            self.fingerprints.pop(ref, None)
+        self.fingerprints.update((fingerprint.ref, fingerprint) for fingerprint in graph_fingerprints(self.thesaurus, scope))
+        self.pending.clear()
+
+        print(f'Writing {len(self.thesaurus.refs())} terms...')
+        write_sorted(self.thesaurus, THESAURUSFILE)
+        print(f'Wrote {THESAURUSFILE}')
+        return True
+
+
+def file_mtimes(indirs: list[str]) -> dict[str, float]:
+    return dict((fn, os.stat(fn).st_mtime) for fn in list_infiles(indirs))
+
+
+def write_snapshot(thesaurus: Thesaurus) -> None:
+    """Write a snapshot of the written thesaurus, for faster loading in the server."""
+    # The triples in the order of the sorted file, as if parsed from it
+    save_snapshot(thesaurus, THESAURUSFILE, sorted(thesaurus, key=nt_line))
+    print(f'Wrote snapshot of {THESAURUSFILE}')
+
+
+def parse_with_snapshot(path: str) -> Thesaurus:
+    """Parse a thesaurus file and write a snapshot of it."""
+    g = RecordingThesaurus().parse(path)
+    save_snapshot(g, path, g.added)
+    print(f'Wrote snapshot of {path}')
+    return g
+
+
+def update_subset(thesaurus: Thesaurus, parsed: dict[str, Thesaurus]) -> None:
+    """Write the part of Homosaurus that the server needs, unless the current subset already fits.
+    Also write snapshots of Homosaurus and the subset, if missing.
+
+    The parsed Homosaurus file is kept in `parsed` by its hash, to reuse in later builds."""
+    if not is_current(thesaurus, HOMOSAURUS_FILE, SUBSET_FILE):
+        source_hash = file_hash(HOMOSAURUS_FILE)
+        if source_hash not in parsed:
+            parsed.clear()
+            if has_snapshot(HOMOSAURUS_FILE):
+                parsed[source_hash] = load_thesaurus(HOMOSAURUS_FILE)
+            else:
+                parsed[source_hash] = parse_with_snapshot(HOMOSAURUS_FILE)
+        count = write_subset(thesaurus, HOMOSAURUS_FILE, SUBSET_FILE, parsed[source_hash])
+        print(f'Wrote {count} linked Homosaurus terms')
+    if not has_snapshot(SUBSET_FILE):
+        parse_with_snapshot(SUBSET_FILE)
+
+
+if __name__ == '__main__':
+    argparser = ArgumentParser(description='Compile source files to a thesaurus file.')
+    argparser.add_argument('--jobs', '-j', type=int, default=os.cpu_count(),
+                           help='number of parallel processes for parsing (default: number of CPUs)')
+    argparser.add_argument('--no-cache', action='store_true',
+                           help='parse all files, ignoring results from earlier builds')
+    argparser.add_argument('--watch', action='store_true',
+                           help='keep running, and build again when source files change')
+    argparser.add_argument('--changes', metavar='FILE',
+                           help='write new, changed and removed terms as JSON to FILE')
+    args = argparser.parse_args()
+
+    indirs = INDIR.split(":")
+    for indir in indirs:
+        print(f'Reading files from {indir}')
+    cache = dict() if args.no_cache else load_cache(CACHEFILE)
+
+    # Read the previous state to track changes.
+    fingerprints = read_fingerprints(THESAURUSFILE)
+
+    mtimes = file_mtimes(indirs)
+    thesaurus = build(list(mtimes), args.jobs, cache, fingerprints, args.changes)
+    save_cache(CACHEFILE, cache)
+
+    write_snapshot(thesaurus)
+    # The parsed Homosaurus file, kept across rebuilds
+    homosaurus = dict()
+    update_subset(thesaurus, homosaurus)
+
+    if args.watch:
+        # The merged source triples and the thesaurus, kept across rebuilds
+        incremental = IncrementalBuild(list(mtimes), args.jobs, cache, thesaurus)
+        print('Watching for changes...')
+        while True:
+            sleep(.2)
+            mtimes_new = file_mtimes(indirs)
+            if mtimes_new == mtimes:
+                continue
+            mtimes = mtimes_new
+            try:
+                if not incremental.update(list(mtimes), args.changes):
+                    fingerprints = graph_fingerprints(incremental.thesaurus)
+                    thesaurus = build(list(mtimes), args.jobs, cache, fingerprints, args.changes)
+                    incremental = IncrementalBuild(list(mtimes), args.jobs, cache, thesaurus)
+                write_snapshot(incremental.thesaurus)
+                save_cache(CACHEFILE, cache)
+                update_subset(incremental.thesaurus, homosaurus)
+            except Exception as err:
+                # Keep watching, the next save might fix it.
+                print(f'Build failed: {type(err)} {err}')
+            print('Watching for changes...')
@@ -0,0 +1,59 @@
+"""
+Gunicorn settings, read automatically when running `gunicorn` in this directory.
+
+By default, the app is loaded once in the master process, and the workers are
+forked from it, sharing the memory of the loaded thesaurus. To keep the shared
+pages clean, the loaded objects are frozen out of the cyclic garbage collector
+before forking. See https://docs.python.org/3/library/gc.html#gc.freeze
+
+Set `PRELOAD=0` to load the app in each worker instead.
+
+The workers do not reload the data by themselves. The master watches the files,
+and on a change, sends itself SIGHUP. On SIGHUP, gunicorn replaces the workers
+gracefully, after the data is reloaded once in the master (if preloading), so
+that the new workers share it again.
+
+The response cache is prewarmed before serving, unless `PREWARM_CACHE=0` is set.
+"""
+
+import gc
+import os
+import signal
+from dotenv import load_dotenv
+import qlit.reload
+
+load_dotenv()
+
+wsgi_app = 'wsgi:app'
+bind = os.environ.get('GUNICORN_BIND', '127.0.0.1:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+preload_app = os.environ.get('PRELOAD', '1') == '1'
+
+# Read by qlit.served when the app is loaded, which is after this file
+os.environ.setdefault('PREWARM_CACHE', '1')
+
+
+def freeze(server):
+    # Loading leaves a lot of garbage, which should not be frozen.
+    gc.collect()
+    gc.freeze()
+    server.log.info(f'Froze {gc.get_freeze_count()} objects before forking workers')
+
+
+def when_ready(server):
+    # The app is loaded (if preloading) and no worker is forked yet.
+    if server.cfg.preload_app:
+        freeze(server)
+    if qlit.reload.RELOAD_INTERVAL:
+        from qlit.served import FILES
+        qlit.reload.Watcher(FILES, lambda: os.kill(os.getpid(), signal.SIGHUP)).watch()
+
+
+def on_reload(server):
+    # On SIGHUP, before the workers are replaced
+    if server.cfg.preload_app:
+        from qlit.server import RELOADER
+        RELOADER.reload()
+        # Let the previous data be collected, and freeze the new data
+        gc.unfreeze()
+        freeze(server)
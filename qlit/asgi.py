@@ -0,0 +1,47 @@
+"""
+ASGI adapter for the server, for uvicorn and similar servers. See `asgi.py`.
+
+The Flask app is synchronous, so a2wsgi runs each request in a thread, while the
+event loop only receives and sends. RDF routes, which may serialize the whole
+thesaurus, run in a small pool of their own (`SERIALIZE_THREADS`), so that
+API requests in the main pool (`ASGI_THREADS`) never wait behind them.
+"""
+
+import os
+from typing import Callable
+from a2wsgi import WSGIMiddleware
+
+ASGI_THREADS = int(os.environ.get('ASGI_THREADS', 8))
+SERIALIZE_THREADS = int(os.environ.get('SERIALIZE_THREADS', 2))
+
+
+def is_serialization(path: str) -> bool:
+    """Whether the path is for an RDF route, rather than the JSON API."""
+    return not path.startswith('/api/') and path != '/metrics'
+
+
+class AsgiAdapter:
+    """Runs a WSGI app in thread pools, as an ASGI app."""
+
+    def __init__(self, app, threads: int = ASGI_THREADS, serialize_threads: int = SERIALIZE_THREADS,
+                 on_startup: Callable[[], None] = None):
+        self.api = WSGIMiddleware(app, workers=threads)
+        self.serialize = WSGIMiddleware(app, workers=serialize_threads)
+        self.on_startup = on_startup
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif scope['type'] == 'http' and is_serialization(scope['path']):
+            await self.serialize(scope, receive, send)
+        else:
+            await self.api(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        """Call `on_startup` when the server starts, before it accepts requests."""
+        while (message := await receive())['type'] != 'lifespan.shutdown':
+            if message['type'] == 'lifespan.startup':
+                if self.on_startup:
+                    self.on_startup()
+                await send({'type': 'lifespan.startup.complete'})
+        await send({'type': 'lifespan.shutdown.complete'})
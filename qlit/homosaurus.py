@@ -0,0 +1,76 @@
+"""
+A subset of Homosaurus with only the terms that QLIT links to, for serving.
+
+The server only uses the labels of Homosaurus terms that QLIT terms match. The
+build writes those to a small N-Triples file, in the order of the full file. Its
+first line records hashes of the full file and of the linked term URIs, so that a
+subset which does not fit the current files is ignored, and the full file loaded
+instead.
+"""
+
+from hashlib import sha256
+import os
+import re
+from rdflib import RDF, SKOS, URIRef
+from .ntriples import nt_line
+from .snapshot import file_hash, load_thesaurus
+from .thesaurus import Thesaurus
+
+HOMOSAURUS_BASE = 'https://homosaurus.org/v3/'
+
+HOMOSAURUS_FILE = 'homosaurus.ttl'
+SUBSET_FILE = 'homosaurus.subset.nt'
+
+# The predicates kept in the subset: enough to tell concepts and to label and search them
+KEPT = (RDF.type, SKOS.prefLabel, SKOS.altLabel, SKOS.hiddenLabel)
+
+HEADER = re.compile(r'# Subset of \S+: source sha256=(\w+), linked sha256=(\w+)')
+
+
+def linked_terms(thesaurus: Thesaurus) -> set[URIRef]:
+    """The Homosaurus terms matched by terms in the thesaurus."""
+    return set(ref for p in (SKOS.exactMatch, SKOS.closeMatch)
+               for ref in thesaurus.objects(None, p) if ref.startswith(HOMOSAURUS_BASE))
+
+
+def linked_hash(linked: set[URIRef]) -> str:
+    return sha256('\n'.join(sorted(linked)).encode('utf-8')).hexdigest()
+
+
+def write_subset(thesaurus: Thesaurus, path: str = HOMOSAURUS_FILE, subset_path: str = SUBSET_FILE,
+                 homosaurus: Thesaurus = None) -> int:
+    """Write the subset of a Homosaurus file that a thesaurus links to. Returns the number of terms.
+
+    If the file is already parsed, give it as `homosaurus` to not parse it again."""
+    if homosaurus is None:
+        homosaurus = load_thesaurus(path)
+    linked = linked_terms(thesaurus)
+    refs = [ref for ref in homosaurus.refs() if ref in linked]
+    tmp_path = subset_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+        f.write(f'# Subset of {os.path.basename(path)}: source sha256={file_hash(path)}, '
+                f'linked sha256={linked_hash(linked)}\n')
+        # Keep the order of the full file, so that labels are listed the same way
+        for ref in refs:
+            f.writelines(nt_line(triple) for triple in homosaurus.triples((ref, None, None))
+                         if triple[1] in KEPT)
+    os.replace(tmp_path, subset_path)
+    return len(refs)
+
+
+def is_current(thesaurus: Thesaurus, path: str, subset_path: str) -> bool:
+    """Whether the subset was made from the Homosaurus file, for the terms the thesaurus links to."""
+    try:
+        with open(subset_path, encoding='utf-8') as f:
+            match = HEADER.match(f.readline())
+    except OSError:
+        return False
+    return bool(match) and match.groups() == (file_hash(path), linked_hash(linked_terms(thesaurus)))
+
+
+def load_homosaurus(thesaurus: Thesaurus, path: str = HOMOSAURUS_FILE, subset_path: str = SUBSET_FILE) -> Thesaurus:
+    """Load the Homosaurus subset for a thesaurus, or the full file if the subset is missing or outdated."""
+    if is_current(thesaurus, path, subset_path):
+        return load_thesaurus(subset_path)
+    print(f'{subset_path} is missing or outdated, loading all of {path}. Run build.py to update it.')
+    return load_thesaurus(path)
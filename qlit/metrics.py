@@ -0,0 +1,137 @@
+"""
+Timing of request phases, as Server-Timing headers and Prometheus metrics.
+
+Enabled with `METRICS=1`. Otherwise, `timed` leaves functions as they are and
+nothing is recorded.
+"""
+
+from collections import defaultdict
+from contextvars import ContextVar
+from functools import wraps
+import os
+from threading import Lock
+from time import perf_counter
+from dotenv import load_dotenv
+
+load_dotenv()
+
+ENABLED = os.environ.get('METRICS') == '1'
+
+# Upper bounds of histogram buckets, in seconds
+BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+
+
+class RequestTimings:
+    """Time spent in each phase while handling one request."""
+
+    def __init__(self):
+        self.start = perf_counter()
+        self.durations: dict[str, float] = dict()
+        # Phases currently running, so that nested calls are not counted twice
+        self.active: set[str] = set()
+
+    def header(self, total: float) -> str:
+        """A Server-Timing header value, with durations in milliseconds."""
+        metrics = [f'{phase};dur={duration * 1000:.3f}' for phase, duration in self.durations.items()]
+        metrics.append(f'total;dur={total * 1000:.3f}')
+        return ', '.join(metrics)
+
+
+current: ContextVar[RequestTimings | None] = ContextVar('current', default=None)
+
+
+def timed(phase: str):
+    """Decorate a function to record its duration as a phase of the current request."""
+    def decorator(func):
+        if not ENABLED:
+            return func
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            timings = current.get()
+            if timings is None or phase in timings.active:
+                return func(*args, **kwargs)
+            timings.active.add(phase)
+            start = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                duration = perf_counter() - start
+                timings.active.remove(phase)
+                timings.durations[phase] = timings.durations.get(phase, 0) + duration
+                REGISTRY.inc('qlit_phase_seconds_total', duration, phase=phase)
+                REGISTRY.inc('qlit_phase_calls_total', 1, phase=phase)
+        return wrapper
+    return decorator
+
+
+class Registry:
+    """Metrics in memory, rendered in the Prometheus text format."""
+
+    TYPES = {
+        'qlit_request_duration_seconds': ('histogram', 'Time to handle a request, by route'),
+        'qlit_phase_seconds_total': ('counter', 'Time spent in each phase of handling requests'),
+        'qlit_phase_calls_total': ('counter', 'Number of times each phase has run'),
+        'qlit_response_bytes_total': ('counter', 'Size of non-streamed response bodies, by MIME type'),
+        'qlit_thesaurus_load_seconds': ('gauge', 'Time to load each thesaurus file'),
+        'qlit_reloads_total': ('counter', 'Times the thesaurus files have been reloaded'),
+        'qlit_cache_hits_total': ('counter', 'Cache hits, by cache'),
+        'qlit_cache_misses_total': ('counter', 'Cache misses, by cache'),
+        'qlit_cache_hit_ratio': ('gauge', 'Share of cache lookups that were hits, by cache'),
+    }
+
+    def __init__(self):
+        self.lock = Lock()
+        self.values: dict[str, dict[tuple, float]] = defaultdict(dict)
+        self.histograms: dict[str, dict[tuple, list]] = defaultdict(dict)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = tuple(labels.items())
+        with self.lock:
+            self.values[name][key] = self.values[name].get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels):
+        with self.lock:
+            self.values[name][tuple(labels.items())] = value
+
+    def observe(self, name: str, value: float, **labels):
+        key = tuple(labels.items())
+        with self.lock:
+            # Count per bucket, then sum and count
+            histogram = self.histograms[name].setdefault(key, [0] * len(BUCKETS) + [0, 0])
+            for i, bound in enumerate(BUCKETS):
+                if value <= bound:
+                    histogram[i] += 1
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    def render(self) -> str:
+        lines = []
+        with self.lock:
+            for name, (type, help) in self.TYPES.items():
+                if name not in self.values and name not in self.histograms:
+                    continue
+                lines.append(f'# HELP {name} {help}')
+                lines.append(f'# TYPE {name} {type}')
+                for key, value in self.values.get(name, {}).items():
+                    lines.append(f'{name}{format_labels(key)} {value}')
+                for key, histogram in self.histograms.get(name, {}).items():
+                    for bound, count in zip(BUCKETS, histogram):
+                        lines.append(f'{name}_bucket{format_labels(key + (("le", str(bound)),))} {count}')
+                    lines.append(f'{name}_bucket{format_labels(key + (("le", "+Inf"),))} {histogram[-1]}')
+                    lines.append(f'{name}_sum{format_labels(key)} {histogram[-2]}')
+                    lines.append(f'{name}_count{format_labels(key)} {histogram[-1]}')
+        return '\n'.join(lines) + '\n'
+
+
+def format_labels(labels: tuple) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{escape_label(value)}"' for key, value in labels) + '}'
+
+
+def escape_label(value) -> str:
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+REGISTRY = Registry()
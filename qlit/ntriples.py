@@ -0,0 +1,63 @@
+"""
+Canonical (sorted) N-Triples output.
+"""
+
+from heapq import merge
+from itertools import islice
+import os
+from tempfile import TemporaryDirectory
+from rdflib import Graph, Literal
+
+# Sort at most this many lines in memory, or else sort in chunks on disk.
+MAX_LINES_IN_MEMORY = 1_000_000
+
+
+def nt_term(node) -> str:
+    """A node as written in N-Triples. Literals are escaped like rdflib's N-Triples serializer does."""
+    if not isinstance(node, Literal):
+        return node.n3()
+    escaped = node.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"').replace('\r', '\\r')
+    if node.language:
+        return f'"{escaped}"@{node.language}'
+    if node.datatype:
+        return f'"{escaped}"^^<{node.datatype}>'
+    return f'"{escaped}"'
+
+
+def nt_line(triple) -> str:
+    """A triple as a line of N-Triples."""
+    s, p, o = triple
+    return f'{s.n3()} {p.n3()} {nt_term(o)} .\n'
+
+
+def sorted_lines(g: Graph, max_lines: int = MAX_LINES_IN_MEMORY):
+    """The N-Triples lines of a graph, in sorted order."""
+    lines = (nt_line(triple) for triple in g)
+    chunk = sorted(islice(lines, max_lines))
+    if len(chunk) < max_lines:
+        yield from chunk
+        return
+
+    # Too many lines, do an external merge sort.
+    with TemporaryDirectory() as tmpdir:
+        chunk_fns = []
+        while chunk:
+            chunk_fn = os.path.join(tmpdir, str(len(chunk_fns)))
+            with open(chunk_fn, 'w', encoding='utf-8', newline='') as f:
+                f.writelines(chunk)
+            chunk_fns.append(chunk_fn)
+            chunk = sorted(islice(lines, max_lines))
+        chunk_files = [open(chunk_fn, encoding='utf-8', newline='') for chunk_fn in chunk_fns]
+        try:
+            yield from merge(*chunk_files)
+        finally:
+            for f in chunk_files:
+                f.close()
+
+
+def write_sorted(g: Graph, path: str, max_lines: int = MAX_LINES_IN_MEMORY) -> None:
+    """Write a graph as sorted N-Triples, replacing the file only when done."""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+        f.writelines(sorted_lines(g, max_lines))
+    os.replace(tmp_path, path)
@@ -0,0 +1,108 @@
+"""
+Reloading data when its files change, or on a signal, without restarting the server.
+
+New data is loaded from scratch in a background thread, while requests are still
+answered from the current data. It then replaces the current data in a single
+assignment. Requests that have already started keep the data they started with,
+and if loading fails, the current data is kept.
+
+Watching is started explicitly by the server at startup. With gunicorn, the
+workers do not reload by themselves. The master watches the files, reloads once
+and replaces the workers with new ones that share the new data, see
+gunicorn.conf.py.
+"""
+
+import os
+import signal
+from threading import Event, Lock, Thread, current_thread, main_thread
+from typing import Callable, Generic, TypeVar
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Seconds between checks of the files, or 0 to only reload on signal
+RELOAD_INTERVAL = float(os.environ.get('RELOAD_INTERVAL', 5))
+
+RELOAD_SIGNAL = signal.SIGHUP
+
+T = TypeVar('T')
+
+
+def file_state(paths: list[str]) -> tuple:
+    """Identify the current contents of some files, by modification time, size and inode."""
+    state = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            state.append((stat.st_mtime_ns, stat.st_size, stat.st_ino))
+        except OSError:
+            state.append(None)
+    return tuple(state)
+
+
+class Watcher:
+    """Calls a function when some files change, checking in a background thread."""
+
+    def __init__(self, paths: list[str], on_change: Callable[[], object], interval: float = RELOAD_INTERVAL):
+        self.paths = paths
+        self.on_change = on_change
+        self.interval = interval
+        self.state = file_state(paths)
+        self.lock = Lock()
+        self.requested = Event()
+        # The process where the watching thread runs. Threads do not survive a fork.
+        self.pid = None
+
+    def watch(self) -> None:
+        """Check for changes in a background thread, unless already doing so in this process."""
+        if self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.pid != os.getpid():
+                self.pid = os.getpid()
+                Thread(target=self.run, name='reloader', daemon=True).start()
+
+    def listen(self, signum: int = RELOAD_SIGNAL) -> None:
+        """Also call it when the process gets a signal. Only the main thread can set signal handlers."""
+        if current_thread() is main_thread():
+            signal.signal(signum, lambda signum, frame: self.requested.set())
+
+    def run(self) -> None:
+        previous = self.state
+        while True:
+            requested = self.requested.wait(self.interval or None)
+            self.requested.clear()
+            state = file_state(self.paths)
+            # A file being written changes on every check, so wait until it stays the same.
+            if requested or state != self.state and state == previous:
+                self.state = state
+                self.on_change()
+            previous = state
+
+
+class Reloader(Watcher, Generic[T]):
+    """Holds data loaded from some files, and replaces it when they change."""
+
+    def __init__(self, load: Callable[[], T], paths: list[str], interval: float = RELOAD_INTERVAL,
+                 first_load: Callable[[], T] = None):
+        # Noted before loading, so that changes made while loading are not missed
+        super().__init__(paths, self.reload, interval)
+        self.load = load
+        # The first load may be done differently, e.g. in-process when nothing is served yet
+        self.current: T = (first_load or load)()
+        self.reloads = 0
+
+    def reload(self) -> bool:
+        """Load the data again and swap it in, or keep the current data if loading fails."""
+        with self.lock:
+            # Whatever the outcome, do not retry until the files change again.
+            self.state = file_state(self.paths)
+            try:
+                data = self.load()
+            except Exception as err:
+                print(f'Reload failed, keeping the current data: {type(err).__name__}: {err}')
+                return False
+            self.current = data
+            self.reloads += 1
+            print(f'Reloaded {", ".join(self.paths)}')
+            return True
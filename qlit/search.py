@@ -0,0 +1,309 @@
+"""
+Label search over QLIT terms and the Homosaurus terms they match.
+"""
+
+from array import array
+import re
+from collections import Counter, OrderedDict, defaultdict
+from collections.abc import Iterable
+from threading import Lock
+from typing import NamedTuple
+import unicodedata
+from rdflib import OWL, SKOS, Graph, URIRef
+from .metrics import timed
+
+
+class Tokenizer:
+    DELIMITER = re.compile(r'[ -/()]')
+
+    @classmethod
+    def split(cls, phrase):
+        return filter(None, cls.DELIMITER.split(phrase))
+
+
+# The different label fields should give different scores
+FIELDS = {
+    SKOS.prefLabel: 1,
+    SKOS.altLabel: .8,
+    SKOS.hiddenLabel: .6,
+}
+
+# Labels of a matched (Homosaurus) term give lower scores to the QLIT term
+MATCHES = {
+    SKOS.exactMatch: .8,
+    SKOS.closeMatch: .5,
+}
+
+
+# Fuzzy hits score less for each edit needed to match
+FUZZY_PENALTY = .7
+
+# Trigram positions are kept in the low bits of index entries, up to a max
+POSITION_BITS = 6
+MAX_POSITION = (1 << POSITION_BITS) - 1
+
+
+def fold(word: str) -> str:
+    """Casefold a word and strip diacritics, so that "Rörelse" and "rorelse" are the same."""
+    decomposed = unicodedata.normalize('NFKD', word.casefold())
+    return ''.join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def trigrams(word: str) -> dict[str, int]:
+    """The trigrams of a word, padded at the start so that short words and prefixes have some.
+
+    Each is given with the position of the last character of its first occurrence."""
+    padded = '  ' + word
+    positions = dict()
+    for i in range(len(word)):
+        positions.setdefault(padded[i:i + 3], i)
+    return positions
+
+
+def max_edits(word: str) -> int:
+    """How many edits a fuzzy match may have. Short words are too short to match loosely."""
+    return 0 if len(word) <= 3 else 1 if len(word) <= 7 else 2
+
+
+def prefix_distance(query: str, word: str, limit: int) -> int | None:
+    """The smallest edit distance between the query and a prefix of the word, if it is within a limit."""
+    # Levenshtein distances from word prefixes to query prefixes, one row per word prefix.
+    # Only cells within `limit` of the diagonal can stay within the limit, others are capped.
+    if word.startswith(query):
+        return 0
+    n = len(query)
+    over = limit + 1
+    row = [min(i, over) for i in range(n + 1)]
+    best = row[n]
+    for j, c in enumerate(word[:n + limit], 1):
+        previous, row = row, [over] * (n + 1)
+        row[0] = min(j, over)
+        for i in range(max(1, j - limit), min(n, j + limit) + 1):
+            distance = previous[i - 1] + (query[i - 1] != c)
+            if previous[i] < distance:
+                distance = previous[i] + 1
+            if row[i - 1] < distance:
+                distance = row[i - 1] + 1
+            row[i] = distance if distance < over else over
+        if row[n] < best:
+            best = row[n]
+        if min(row) == over:
+            break
+    return best if best <= limit else None
+
+
+class Posting(NamedTuple):
+    """An occurrence of a word in a label, recorded for the QLIT term it leads to."""
+    ref: URIRef
+    field: URIRef
+    position: int
+    via: URIRef | None = None
+
+    @property
+    def score(self) -> float:
+        # Score more if match appears early in label
+        score = (10 - min(self.position, 5)) * FIELDS[self.field]
+        if self.via:
+            score *= MATCHES[self.via]
+        return score
+
+
+class SearchIndex:
+    """Maps every prefix of every label word to the postings of that word.
+
+    For fuzzy search, label words are also folded (see `fold`), and the folded
+    words are indexed by their trigrams."""
+
+    def __init__(self, graph: Graph):
+        self.postings: dict[str, list[Posting]] = defaultdict(list)
+        words: dict[str, set[str]] = defaultdict(set)
+        for ref in graph.concepts():
+            targets = list(self.targets(graph, ref))
+            if not targets:
+                continue
+            for field in FIELDS:
+                for label in graph.objects(ref, field):
+                    for prefix, position in self.prefixes(label):
+                        for target, via in targets:
+                            self.postings[prefix].append(Posting(target, field, position, via))
+                    for word in Tokenizer.split(label.lower()):
+                        words[fold(word)].add(word)
+        # Freeze to a plain dict so lookups of unknown prefixes do not grow it
+        self.postings = dict(self.postings)
+
+        # Folded words, each with the lowercased words that fold to it
+        self.words: list[str] = sorted(words)
+        self.forms: list[tuple[str, ...]] = [tuple(sorted(words[word])) for word in self.words]
+        # Trigrams to the words having them, packed with the position where they first occur
+        word_trigrams = defaultdict(list)
+        for i, word in enumerate(self.words):
+            for trigram, position in trigrams(word).items():
+                word_trigrams[trigram].append(i << POSITION_BITS | min(position, MAX_POSITION))
+        self.trigrams: dict[str, array] = dict((trigram, array('I', entries))
+                                               for trigram, entries in word_trigrams.items())
+
+    @staticmethod
+    def targets(graph: Graph, ref: URIRef):
+        """The non-deprecated QLIT terms that should be found by the labels of a term."""
+        candidates = []
+        # Is a QLIT term: Record hits for it
+        if ref.startswith("https://queerlit"):
+            candidates.append((ref, None))
+        # Is a Homosaurus term: Record hits for the matching QLIT terms
+        for via in MATCHES:
+            for sref in graph.subjects(via, ref):
+                candidates.append((sref, via))
+        for target, via in candidates:
+            if not graph.value(target, OWL.deprecated):
+                yield target, via
+
+    @staticmethod
+    def prefixes(label: str):
+        """Word prefixes in a label, each with the position of the first word having it."""
+        seen = set()
+        for position, word in enumerate(Tokenizer.split(label.lower())):
+            for end in range(1, len(word) + 1):
+                prefix = word[:end]
+                if prefix not in seen:
+                    seen.add(prefix)
+                    yield prefix, position
+
+    def fuzzy_matches(self, query: str, candidates: Iterable[int] = None) -> dict[int, int]:
+        """Find label words that start with something close to a query word, by index in `words`,
+        with their edit distances.
+
+        A word within n edits of the query shares all but at most 3n of its trigrams,
+        so only words sharing enough trigrams are compared to the query. Alternatively,
+        the words to compare can be given, see `QueryCache`."""
+        query = fold(query)
+        limit = max_edits(query)
+        if candidates is None:
+            query_trigrams = trigrams(query)
+            # Only the start of a word can match the query
+            end = len(query) + limit
+            counts = Counter()
+            for trigram in query_trigrams:
+                counts.update(entry >> POSITION_BITS for entry in self.trigrams.get(trigram, ())
+                              if entry & MAX_POSITION < end)
+            needed = len(query_trigrams) - 3 * limit
+            candidates = [i for i, count in counts.items() if count >= needed]
+        matches = dict()
+        for i in candidates:
+            if len(self.words[i]) >= len(query) - limit:
+                distance = prefix_distance(query, self.words[i], limit)
+                if distance is not None:
+                    matches[i] = distance
+        return matches
+
+    def word_hits(self, qw: str, fuzzy=False, candidates: Iterable[int] = None) -> tuple[dict[URIRef, float], dict[int, int]]:
+        """Score terms by one lowercased query word, and give the fuzzy matches that the scores are from."""
+        forms = {qw: 0}
+        matches = dict()
+        if fuzzy:
+            matches = self.fuzzy_matches(qw, candidates)
+            for i, distance in matches.items():
+                for form in self.forms[i]:
+                    # Words starting with the query word are already among its exact hits
+                    if not form.startswith(qw):
+                        forms[form] = distance
+        hits = dict()
+        for form, distance in forms.items():
+            for posting in self.postings.get(form, ()):
+                score = posting.score * FUZZY_PENALTY ** distance if distance else posting.score
+                if score > hits.get(posting.ref, 0):
+                    hits[posting.ref] = score
+        return hits, matches
+
+    @timed('search')
+    def search(self, s: str, fuzzy=False) -> dict[URIRef, float]:
+        """Score terms by a user-given incremental (startswith) search string.
+
+        If fuzzy, also find words with a few typos or different diacritics, scoring
+        less for each edit."""
+        return merge_hits(self.word_hits(qw, fuzzy)[0] for qw in query_words(s))
+
+
+def query_words(s: str) -> list[str]:
+    """The distinct lowercased words of a search string, in a normalized order."""
+    return sorted(set(Tokenizer.split(s.lower())))
+
+
+def merge_hits(word_hits: Iterable[dict[URIRef, float]]) -> dict[URIRef, float]:
+    """Combine the hits of query words, keeping the best score of each term."""
+    hits = dict()
+    for w_hits in word_hits:
+        if not hits:
+            hits = dict(w_hits)
+            continue
+        for ref, score in w_hits.items():
+            if score > hits.get(ref, 0):
+                hits[ref] = score
+    return hits
+
+
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+
+
+class QueryEntry(NamedTuple):
+    hits: dict[URIRef, float]
+    matches: dict[int, int]
+    limit: int
+
+
+class QueryCache:
+    """Search results by query word, least recently used ones evicted first.
+
+    Autocompletion searches for one prefix after another. A fuzzy query word can only
+    match words that a shorter prefix of it matched, with the same edit limit, so those
+    are the only candidates compared to it. Exact prefixes are indexed in full anyway.
+
+    Hits are shared between searches and must not be modified. A cache is for one
+    version of the index, so it is made anew when the thesaurus changes."""
+
+    def __init__(self, index: SearchIndex, maxsize: int):
+        self.index = index
+        self.maxsize = maxsize
+        self.entries: OrderedDict[tuple[str, bool], QueryEntry] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = Lock()
+
+    def cache_info(self) -> CacheInfo:
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self.entries))
+
+    @timed('search')
+    def search(self, s: str, fuzzy=False) -> dict[URIRef, float]:
+        """Like `SearchIndex.search`, but with cached results for each query word."""
+        return merge_hits(self.word_hits(qw, fuzzy) for qw in query_words(s))
+
+    def word_hits(self, qw: str, fuzzy: bool) -> dict[URIRef, float]:
+        key = (qw, fuzzy)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry.hits
+            self.misses += 1
+            candidates = None
+            limit = max_edits(fold(qw))
+            if fuzzy:
+                # The longest cached prefix with the same edit limit
+                for end in range(len(qw) - 1, 0, -1):
+                    shorter = self.entries.get((qw[:end], fuzzy))
+                    if shorter is not None and shorter.limit == limit:
+                        candidates = shorter.matches
+                        break
+
+        # Search outside the lock, so that searches in other threads do not wait
+        hits, matches = self.index.word_hits(qw, fuzzy, candidates)
+        with self.lock:
+            self.entries[key] = QueryEntry(hits, matches, limit)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+        return hits
@@ -0,0 +1,111 @@
+"""
+The data that the server answers requests from, loaded from one version of the thesaurus files.
+
+Loading can be done in a subprocess (`python -m qlit.served`), which builds the
+store and serializes the responses to prewarm the cache with, and returns them
+pickled. Then the serving process only has to unpickle them, and is not held up
+by building and collecting the RDF graphs.
+"""
+
+from contextlib import redirect_stdout
+from functools import lru_cache
+from itertools import islice
+import os
+import pickle
+import subprocess
+import sys
+from dotenv import load_dotenv
+from .homosaurus import HOMOSAURUS_FILE, SUBSET_FILE
+from .metrics import timed
+from .simple import SimpleThesaurus
+from .store import TermStore, load_store
+
+load_dotenv()
+
+# The thesaurus, Homosaurus and the subset of Homosaurus that is used, see `load_store`
+FILES = ['qlit.nt', HOMOSAURUS_FILE, SUBSET_FILE]
+
+FORMATS = {
+    'ttl': 'text/turtle',
+    'jsonld': 'application/ld+json',
+    'xml': 'application/rdf+xml',
+}
+
+RESPONSE_CACHE_SIZE = int(os.environ.get('RESPONSE_CACHE_SIZE', 4096))
+PREWARM_CACHE = os.environ.get('PREWARM_CACHE', '0') == '1'
+
+
+@timed('serialize')
+def serialize(store: TermStore, name: str | None, mimetype: str) -> bytes:
+    """Serialize one term, or the full thesaurus if `name` is None."""
+    termset = store.graph() if name is None else store.termset(store.find(name))
+    return termset.serialize(format=mimetype).encode('utf-8')
+
+
+def prewarm(store: TermStore, limit: int = RESPONSE_CACHE_SIZE) -> dict[tuple[str | None, str], bytes]:
+    """Serialize up to `limit` responses ahead of the first requests: the full thesaurus
+    in every format first, then the terms in every format."""
+    responses = dict()
+    keys = ((name, mimetype) for name in [None] + [record.name for record in store.records]
+            for mimetype in FORMATS.values())
+    for name, mimetype in islice(keys, limit):
+        try:
+            responses[name, mimetype] = serialize(store, name, mimetype)
+        except Exception as err:
+            # Leave it uncached, so the request will fail like it would without cache.
+            print(f'Could not serialize {name or "thesaurus"} as {mimetype}: {err}')
+    return responses
+
+
+class ServedData:
+    """Everything served from one version of the thesaurus files, with its response cache.
+
+    It is not modified after loading, except for caching responses. On reload, it is
+    replaced by a new instance."""
+
+    def __init__(self, store: TermStore, responses: dict[tuple[str | None, str], bytes] = None):
+        self.store = store
+        self.simple = SimpleThesaurus(store)
+        responses = responses or dict()
+
+        def serialize_once(name: str | None, mimetype: str) -> bytes:
+            # Take prewarmed responses over into the cache, serialize others.
+            if (name, mimetype) in responses:
+                return responses.pop((name, mimetype))
+            return serialize(store, name, mimetype)
+        self.serialize = lru_cache(maxsize=RESPONSE_CACHE_SIZE)(serialize_once)
+
+        self.build_derived_data()
+        if responses:
+            for name, mimetype in list(responses):
+                self.serialize(name, mimetype)
+            print(f'Prewarmed response cache with {self.serialize.cache_info().currsize} responses')
+
+    def build_derived_data(self):
+        """Build JSON terms ahead of the first requests, so that forked workers can share them."""
+        self.simple.terms
+        self.simple.trees
+
+
+def load_data() -> ServedData:
+    # Only the compact store is kept, the graphs are dropped after building it.
+    store = load_store(*FILES)
+    return ServedData(store, prewarm(store) if PREWARM_CACHE else None)
+
+
+def load_data_separately() -> ServedData:
+    """Like `load_data`, but with the RDF work done in a subprocess."""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    result = subprocess.run([sys.executable, '-m', 'qlit.served'], stdout=subprocess.PIPE, env=env, check=True)
+    store, responses = pickle.loads(result.stdout)
+    return ServedData(store, responses)
+
+
+if __name__ == '__main__':
+    # Write a pickled store and prewarmed responses to stdout, see `load_data_separately`.
+    # Use the importable module rather than `__main__`, so that the classes can be unpickled.
+    from qlit import served
+    with redirect_stdout(sys.stderr):
+        store = served.load_store(*served.FILES)
+        responses = served.prewarm(store) if served.PREWARM_CACHE else None
+    sys.stdout.buffer.write(pickle.dumps((store, responses), protocol=pickle.HIGHEST_PROTOCOL))
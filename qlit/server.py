@@ -1,21 +1,26 @@
-from flask import Flask, Response, jsonify, make_response, request
+from time import perf_counter
+from flask import Flask, Response, g, jsonify, make_response, request
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
-from qlit.thesaurus import TermNotFoundError, Termset, Thesaurus
-from qlit.simple import SimpleThesaurus, name_to_ref
+from qlit import metrics
+from qlit.reload import Reloader
+from qlit.served import FILES, FORMATS, load_data, load_data_separately
+from qlit.simple import project
+from qlit.thesaurus import TermNotFoundError
+from qlit.snapshot import LOAD_TIMES
 
 app = Flask(__name__)
 CORS(app)
 
-THESAURUS = Thesaurus().parse('qlit.nt')
-print(f'Loaded thesaurus with {len(THESAURUS.refs())} terms')
+# Reloads are loaded in a subprocess, so that this process keeps serving meanwhile.
+RELOADER = Reloader(load_data_separately, FILES, first_load=load_data)
 
-THESAURUS_SIMPLE = SimpleThesaurus(THESAURUS)
 
-FORMATS = {
-    'ttl': 'text/turtle',
-    'jsonld': 'application/ld+json',
-    'xml': 'application/rdf+xml',
-}
+def start_reloading() -> None:
+    """Reload when the files change or on SIGHUP. Call at startup, in the main thread of the
+    process that serves requests. Gunicorn does not, its master reloads instead."""
+    RELOADER.listen()
+    RELOADER.watch()
 
 
 def find_mimetype() -> str:
@@ -33,11 +38,32 @@ def find_mimetype() -> str:
     return 'text/turtle'
 
 
-def termset_response(termset: Termset) -> Response:
+def page() -> dict:
+    """The `limit` and `offset` params, for routes that list terms."""
+    limit = request.args.get('limit', type=int)
+    return dict(
+        limit=None if limit is None else max(limit, 0),
+        offset=max(request.args.get('offset', 0, type=int), 0),
+    )
+
+
+def fields() -> list[str] | None:
+    """The `fields` param, a comma-separated list of the term fields to respond with."""
+    param = request.args.get('fields')
+    return [field for field in param.split(',') if field] if param else None
+
+
+@app.before_request
+def use_current_data():
+    """Answer each request from the data that is current when it starts, even if it is replaced meanwhile."""
+    g.data = RELOADER.current
+
+
+def termset_response(name: str | None) -> Response:
     """Use preferred MIME type for serialization and response."""
     mimetype = find_mimetype()
 
-    data = termset.serialize(format=mimetype)
+    data = g.data.serialize(name, mimetype)
 
     # Specify encoding.
     if mimetype.startswith('text/'):
@@ -51,73 +77,179 @@ def termset_response(termset: Termset) -> Response:
 
 @app.route('/')
 def rdf_all():
-    return termset_response(THESAURUS)
+    return termset_response(None)
 
 
 @app.route('/<name>')
 def rdf_one(name):
-    ref = name_to_ref(name)
-    return termset_response(THESAURUS.get(ref))
+    return termset_response(name)
 
 # "Api" routes are in simple non-RDF space.
 
 
 @app.route("/api/term/<name>")
 def api_one(name):
-    return jsonify(THESAURUS_SIMPLE.get(name))
+    return jsonify(g.data.simple.get(name))
+
+
+@app.route("/api/terms", methods=['GET', 'POST'])
+def api_terms():
+    """Many terms by name, from `name` params or a JSON body like `{"names": [...], "expand": [...]}`."""
+    if request.method == 'POST':
+        body = request.get_json(silent=True)
+        if not isinstance(body, dict) or not isinstance(body.get('names'), list):
+            return error_response('Expected a JSON object with a list of "names"', 400)
+        names = body['names']
+        expand = body.get('expand', [])
+    else:
+        names = request.args.getlist('name')
+        expand = [relation for relation in request.args.get('expand', '').split(',') if relation]
+    if not isinstance(expand, list) or not all(isinstance(value, str) for value in names + expand):
+        return error_response('Names and relations to expand must be strings', 400)
+    try:
+        return jsonify(g.data.simple.get_many(names, expand))
+    except ValueError as err:
+        return error_response(str(err), 400)
+
+
+@app.route("/api/export")
+def api_export():
+    """All terms as JSON Lines, streamed."""
+    terms = g.data.simple.export(
+        collection=request.args.get('collection'),
+        roots=bool(request.args.get('roots')),
+        deprecated=bool(request.args.get('deprecated')),
+    )
+    only = fields()
+    lines = (app.json.dumps(project([term], only)[0]) + '\n' for term in terms)
+    return Response(lines, mimetype='application/x-ndjson')
 
 
 @app.route("/api/labels")
 def api_labels():
-    return jsonify(THESAURUS_SIMPLE.get_labels())
+    return jsonify(g.data.simple.get_labels(**page()))
 
 
 @app.route("/api/search")
 def api_search():
     # TODO Handle missing/bad arg
     s = request.args.get('s')
-    return jsonify(THESAURUS_SIMPLE.search(s))
+    fuzzy = bool(request.args.get('fuzzy'))
+    return jsonify(project(g.data.simple.search(s, fuzzy=fuzzy, **page()), fields()))
 
 
 @app.route("/api/collections")
 def api_collections():
-    return jsonify(THESAURUS_SIMPLE.get_collections())
+    return jsonify(project(g.data.simple.get_collections(), fields()))
 
 
 @app.route("/api/collections/<name>")
 def api_collection(name):
     tree = bool(request.args.get('tree'))
-    return jsonify(THESAURUS_SIMPLE.get_collection(name, tree))
+    depth = request.args.get('depth', type=int)
+    return jsonify(project(g.data.simple.get_collection(name, tree, depth, **page()), fields()))
 
 
 @app.route("/api/roots")
 def api_roots():
-    return jsonify(THESAURUS_SIMPLE.get_roots())
+    tree = bool(request.args.get('tree'))
+    depth = request.args.get('depth', type=int)
+    return jsonify(project(g.data.simple.get_roots(tree, depth, **page()), fields()))
 
 
 @app.route("/api/narrower")
 def api_narrower():
     # TODO Handle missing/bad arg
     broader = request.args.get('broader')
-    return jsonify(THESAURUS_SIMPLE.get_narrower(broader))
+    return jsonify(project(g.data.simple.get_narrower(broader), fields()))
 
 
 @app.route("/api/broader")
 def api_broader():
     # TODO Handle missing/bad arg
     narrower = request.args.get('narrower')
-    return jsonify(THESAURUS_SIMPLE.get_broader(narrower))
+    return jsonify(project(g.data.simple.get_broader(narrower), fields()))
 
 @app.route("/api/related")
 def api_related():
     # TODO Handle missing/bad arg
     other = request.args.get('other')
-    return jsonify(THESAURUS_SIMPLE.get_related(other))
+    return jsonify(project(g.data.simple.get_related(other), fields()))
 
 
-@app.errorhandler(TermNotFoundError)
-def handle_term_not_found(e):
+@app.route("/api/ancestors")
+def api_ancestors():
+    narrower = request.args.get('narrower')
+    if not narrower:
+        return error_response('Missing parameter "narrower"', 400)
+    return jsonify(project(g.data.simple.get_broader_transitive(narrower, **page()), fields()))
+
+
+@app.route("/api/descendants")
+def api_descendants():
+    broader = request.args.get('broader')
+    if not broader:
+        return error_response('Missing parameter "broader"', 400)
+    return jsonify(project(g.data.simple.get_narrower_transitive(broader, **page()), fields()))
+
+
+# Metrics are only collected, and served, if enabled.
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+
+    @metrics.timed('json')
+    def response(self, *args, **kwargs):
+        return super().response(*args, **kwargs)
+
+
+def start_timing():
+    metrics.current.set(metrics.RequestTimings())
+
+
+def finish_timing(response: Response) -> Response:
+    timings = metrics.current.get()
+    if timings is None:
+        return response
+    metrics.current.set(None)
+    duration = perf_counter() - timings.start
+    response.headers['Server-Timing'] = timings.header(duration)
+    route = request.url_rule.rule if request.url_rule else 'none'
+    metrics.REGISTRY.observe('qlit_request_duration_seconds', duration, route=route)
+    if not response.is_streamed and response.content_length is not None:
+        metrics.REGISTRY.inc('qlit_response_bytes_total', response.content_length, mimetype=response.mimetype)
+    return response
+
+
+def metrics_response() -> Response:
+    """All metrics in the Prometheus text format."""
+    for path, seconds in LOAD_TIMES.items():
+        metrics.REGISTRY.set('qlit_thesaurus_load_seconds', seconds, file=path)
+    # The caches are per version of the data, so they start over on reload.
+    for cache, func in [('responses', g.data.serialize), ('search', g.data.simple.search_cache)]:
+        info = func.cache_info()
+        metrics.REGISTRY.set('qlit_cache_hits_total', info.hits, cache=cache)
+        metrics.REGISTRY.set('qlit_cache_misses_total', info.misses, cache=cache)
+        if info.hits + info.misses:
+            metrics.REGISTRY.set('qlit_cache_hit_ratio', info.hits / (info.hits + info.misses), cache=cache)
+    metrics.REGISTRY.set('qlit_reloads_total', RELOADER.reloads)
+    return Response(metrics.REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+
+if metrics.ENABLED:
+    app.json = TimedJSONProvider(app)
+    app.before_request(start_timing)
+    app.after_request(finish_timing)
+    app.add_url_rule('/metrics', 'metrics', metrics_response)
+
+
+def error_response(message: str, status: int) -> Response:
     return make_response(jsonify({
         'status': 'error',
-        'message': str(e),
-    }), 404)
+        'message': message,
+    }), status)
+
+
+@app.errorhandler(TermNotFoundError)
+def handle_term_not_found(e):
+    return error_response(str(e), 404)
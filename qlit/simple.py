@@ -2,26 +2,29 @@
 Non-RDF interfaces to the thesaurus.
 """
 
+from functools import cache, wraps
+import heapq
+from itertools import islice
+import os
 from os.path import basename
-import re
 from dotenv import load_dotenv
-from rdflib import OWL, SKOS, URIRef, Literal
+from rdflib import SKOS, URIRef, Literal
+from .metrics import timed
+from .search import QueryCache, SearchIndex, Tokenizer
+from .homosaurus import HOMOSAURUS_BASE, HOMOSAURUS_FILE, SUBSET_FILE, load_homosaurus
+from .snapshot import load_thesaurus
+from .store import ExternalTerm, TermStore
 from .thesaurus import BASE, Termset, Thesaurus
-from collections.abc import Generator
+from collections.abc import Generator, Iterable, Iterator
 
 
 load_dotenv()
 
+# Number of search query words to keep results for
+SEARCH_CACHE_SIZE = int(os.environ.get('SEARCH_CACHE_SIZE', 1024))
 
-HOMOSAURUS = Thesaurus().parse('homosaurus.ttl')
-
-
-class Tokenizer:
-    DELIMITER = re.compile(r'[ -/()]')
-
-    @classmethod
-    def split(cls, phrase):
-        return filter(None, cls.DELIMITER.split(phrase))
+# Relations to other QLIT terms, which can be expanded to full terms
+RELATIONS = ('broader', 'narrower', 'related')
 
 
 def name_to_ref(name: str) -> URIRef:
@@ -32,15 +35,29 @@ def ref_to_name(ref: URIRef) -> str:
     return basename(ref)
 
 
-def resolve_external_term(ref):
-    if ref.startswith('https://homosaurus.org/v3/'):
-        return resolve_homosaurus_term(ref)
+@cache
+def default_homosaurus(full: bool = False) -> Thesaurus:
+    """Homosaurus for resolving matches when no graph is given, loaded on first use: the subset
+    written by the build, or all of it."""
+    if full or not os.path.exists(SUBSET_FILE):
+        return load_thesaurus(HOMOSAURUS_FILE)
+    return load_thesaurus(SUBSET_FILE)
+
+
+def resolve_external_term(ref, homosaurus: Thesaurus = None):
+    if ref.startswith(HOMOSAURUS_BASE):
+        return resolve_homosaurus_term(ref, homosaurus)
     return SimpleTerm(uri=str(ref))
 
 
-def resolve_homosaurus_term(ref):
-    prefLabel = HOMOSAURUS.value(ref, SKOS.prefLabel)
-    altLabels = list(HOMOSAURUS.objects(ref, SKOS.altLabel))
+def resolve_homosaurus_term(ref, homosaurus: Thesaurus = None):
+    if homosaurus is None:
+        # The subset may be outdated, then look in all of Homosaurus.
+        homosaurus = default_homosaurus()
+        if (ref, None, None) not in homosaurus:
+            homosaurus = default_homosaurus(full=True)
+    prefLabel = homosaurus.value(ref, SKOS.prefLabel)
+    altLabels = list(homosaurus.objects(ref, SKOS.altLabel))
     return SimpleTerm(
         uri=str(ref),
         prefLabel=str(prefLabel),
@@ -51,8 +68,9 @@ def resolve_homosaurus_term(ref):
 class SimpleTerm(dict):
 
     @staticmethod
-    def from_subject(termset: Termset, subject: URIRef) -> "SimpleTerm":
-        """Make a simple dict with the predicate-objects of a term in the thesaurus."""
+    def from_subject(termset: Termset, subject: URIRef, homosaurus: Thesaurus = None) -> "SimpleTerm":
+        """Make a simple dict with the predicate-objects of a term in the thesaurus, and the labels
+        of the Homosaurus terms it matches (from the build's subset, unless given)."""
         return SimpleTerm(
             name=ref_to_name(subject),
             uri=str(subject),
@@ -68,14 +86,40 @@ class SimpleTerm(dict):
             related=[ref_to_name(ref)
                      for ref in termset.objects(subject, SKOS.related)],
             # Relations to external terms
-            exactMatch=[resolve_external_term(ref) for ref in termset.objects(subject, SKOS.exactMatch)],
-            closeMatch=[resolve_external_term(ref) for ref in termset.objects(subject, SKOS.closeMatch)],
+            exactMatch=[resolve_external_term(ref, homosaurus) for ref in termset.objects(subject, SKOS.exactMatch)],
+            closeMatch=[resolve_external_term(ref, homosaurus) for ref in termset.objects(subject, SKOS.closeMatch)],
         )
 
     @staticmethod
-    def from_termset(termset: Termset) -> list["SimpleTerm"]:
+    def from_record(store: TermStore, number: int, externals: list["SimpleTerm"]) -> "SimpleTerm":
+        """Make a simple dict for a term in a store, with simple dicts for the external terms."""
+        record = store.records[number]
+        return SimpleTerm(
+            name=record.name,
+            uri=record.uri,
+            prefLabel=str(record.prefLabel),
+            altLabels=list(record.altLabels),
+            hiddenLabels=list(record.hiddenLabels),
+            scopeNote=str(record.scopeNote),
+            # Relations to QLIT terms
+            broader=[store.names[n] for n in record.broader],
+            narrower=[store.names[n] for n in record.narrower],
+            related=[store.names[n] for n in record.related],
+            # Relations to external terms
+            exactMatch=[externals[n] for n in record.exactMatch],
+            closeMatch=[externals[n] for n in record.closeMatch],
+        )
+
+    @staticmethod
+    def from_external(term: ExternalTerm) -> "SimpleTerm":
+        if term.prefLabel is None:
+            return SimpleTerm(uri=term.uri)
+        return SimpleTerm(uri=term.uri, prefLabel=term.prefLabel, altLabels=list(term.altLabels))
+
+    @staticmethod
+    def from_termset(termset: Termset, homosaurus: Thesaurus = None) -> list["SimpleTerm"]:
         """Make simple dicts for the given set of terms."""
-        terms = [SimpleTerm.from_subject(termset, ref) for ref in termset.refs()]
+        terms = [SimpleTerm.from_subject(termset, ref, homosaurus) for ref in termset.refs()]
         terms.sort(key=lambda term: term['prefLabel'].lower())
         return terms
 
@@ -102,124 +146,264 @@ class SimpleTerm(dict):
                 yield word.lower()
 
 
-class SimpleThesaurus():
-    """Like Thesaurus but with unqualified names as inputs and dicts as output."""
+def paginate(items: list, limit: int = None, offset: int = 0) -> list:
+    """Slice out a page of a list, or everything from the offset on if there is no limit."""
+    return items[offset:] if limit is None else items[offset:offset + limit]
+
+
+def project(terms: list[SimpleTerm], fields: list[str] = None) -> list[dict]:
+    """Keep only some fields of terms, also in terms expanded within them (like narrower terms in trees)."""
+    if not fields:
+        return terms
+    projected = []
+    for term in terms:
+        term = dict((field, term[field]) for field in fields if field in term)
+        for relation in RELATIONS:
+            if term.get(relation) and isinstance(term[relation][0], dict):
+                term[relation] = project(term[relation], fields)
+        projected.append(term)
+    return projected
+
+
+def cached_per_version(method):
+    """Cache the result of a SimpleThesaurus method until the store is rebuilt."""
+    attr = f'_cached_{method.__name__}'
+
+    @wraps(method)
+    def wrapper(self):
+        store, value = getattr(self, attr, (None, None))
+        if store is not self.store:
+            store = self.store
+            value = method(self)
+            setattr(self, attr, (store, value))
+        return value
+    return wrapper
+
 
-    def __init__(self, thesaurus: Thesaurus):
-        self.t = thesaurus
-        self.th = Thesaurus()
-        self.th += self.t + HOMOSAURUS
+class SimpleThesaurus():
+    """Like Thesaurus but with unqualified names as inputs and dicts as output.
+
+    Queries are answered from a TermStore. If given a Thesaurus instead, a store
+    is built from it, and rebuilt whenever the thesaurus changes."""
+
+    def __init__(self, source: Thesaurus | TermStore):
+        if isinstance(source, TermStore):
+            self.t = None
+            self._store = source
+        else:
+            self.t = source
+            self._store = None
+
+    @property
+    def store(self) -> TermStore:
+        if self.t is not None and (self._store is None or self._store.version != self.t.version):
+            self._store = TermStore(self.t, load_homosaurus(self.t))
+        return self._store
+
+    @property
+    def index(self) -> SearchIndex:
+        return self.store.search_index
+
+    @property
+    @cached_per_version
+    def search_cache(self) -> QueryCache:
+        """Search results for recent query words, started over if the store has changed."""
+        return QueryCache(self.index, SEARCH_CACHE_SIZE)
+
+    @property
+    @cached_per_version
+    @timed('simple')
+    def terms(self) -> list[SimpleTerm]:
+        """All terms as SimpleTerm dicts by term number, rebuilt if the store has changed.
+
+        The dicts are shared between responses and must not be modified."""
+        store = self.store
+        externals = [SimpleTerm.from_external(term) for term in store.externals]
+        return [SimpleTerm.from_record(store, number, externals) for number in range(len(store))]
+
+    @property
+    @cached_per_version
+    @timed('simple')
+    def trees(self) -> list[SimpleTerm]:
+        """All terms with narrower terms expanded recursively, rebuilt if the store has changed.
+
+        Subtrees are shared, and must not be modified. A narrower relation that would
+        close a cycle is left out."""
+        trees = [None] * len(self.terms)
+        for top in range(len(self.terms)):
+            # Depth-first, expanding a term after all its narrower terms.
+            stack = [(top, False)]
+            path = set()
+            while stack:
+                number, ready = stack.pop()
+                if ready:
+                    path.remove(number)
+                    tree = SimpleTerm(self.terms[number])
+                    tree['narrower'] = [trees[n] for n in self.narrower_numbers(number) if trees[n] is not None]
+                    trees[number] = tree
+                    continue
+                if trees[number] is not None:
+                    continue
+                path.add(number)
+                stack.append((number, True))
+                for narrower in reversed(self.narrower_numbers(number)):
+                    # A narrower term already on the path closes a cycle. The build reports cycles,
+                    # so just leave the relation out here.
+                    if narrower not in path and trees[narrower] is None:
+                        stack.append((narrower, False))
+        return trees
+
+    def narrower_numbers(self, number: int) -> list[int]:
+        return self.store.terms(self.store.records[number].narrower)
+
+    @timed('simple')
+    def from_numbers(self, numbers) -> list[SimpleTerm]:
+        """Look up simple dicts for the given terms, like `Thesaurus.terms_in` but ordered by label.
+
+        Deprecated terms are left out."""
+        records = self.store.records
+        numbers = [number for number in dict.fromkeys(numbers) if not records[number].deprecated]
+        # Concepts before collections, as in `Termset.refs()`
+        numbers.sort(key=lambda number: not records[number].concept)
+        terms = [self.terms[number] for number in numbers]
+        terms.sort(key=lambda term: term['prefLabel'].lower())
+        return terms
 
     def get(self, name: str) -> SimpleTerm:
-        ref = name_to_ref(name)
-        self.t.assert_term_exists(ref)
-        return SimpleTerm.from_subject(self.t, name_to_ref(name))
+        number = self.store.find(name)
+        return self.terms[number]
+
+    @timed('simple')
+    def get_many(self, names: Iterable[str], expand: Iterable[str] = ()) -> dict[str, SimpleTerm | None]:
+        """Look up many terms at once, keyed by name. Names that are not found map to None.
+
+        Relations listed in `expand` are replaced by lists of terms, as from `get_broader` etc."""
+        expand = list(dict.fromkeys(expand))
+        for relation in expand:
+            if relation not in RELATIONS:
+                raise ValueError(f'Cannot expand {relation!r}, only {", ".join(RELATIONS)}')
+        store = self.store
+        terms = dict()
+        for name in names:
+            number = store.numbers.get(name)
+            if number is None:
+                terms[name] = None
+                continue
+            term = self.terms[number]
+            if expand:
+                term = SimpleTerm(term)
+                record = store.records[number]
+                for relation in expand:
+                    term[relation] = self.from_numbers(store.terms(getattr(record, relation)))
+            terms[name] = term
+        return terms
 
-    def get_roots(self) -> Termset:
-        """Find all terms without parents."""
-        termset = self.t.get_roots()
-        return SimpleTerm.from_termset(termset)
+    def get_roots(self, tree=False, depth=None, limit=None, offset=0) -> list[SimpleTerm]:
+        """Find all terms without parents, optionally only a page of them."""
+        terms = paginate(self.from_numbers(self.store.roots), limit, offset)
+        if tree:
+            terms = self.expand_narrower(terms, depth)
+        return terms
 
     def get_narrower(self, broader: str) -> list[SimpleTerm]:
-        ref = name_to_ref(broader)
-        self.t.assert_term_exists(ref)
-        termset = self.t.get_narrower(ref)
-        return SimpleTerm.from_termset(termset)
+        record = self.store.records[self.store.find(broader)]
+        return self.from_numbers(self.store.terms(record.narrower))
 
     def get_broader(self, narrower: str) -> list[SimpleTerm]:
-        ref = name_to_ref(narrower)
-        self.t.assert_term_exists(ref)
-        termset = self.t.get_broader(ref)
-        return SimpleTerm.from_termset(termset)
+        record = self.store.records[self.store.find(narrower)]
+        return self.from_numbers(self.store.terms(record.broader))
 
     def get_related(self, other: str) -> list[SimpleTerm]:
-        ref = name_to_ref(other)
-        self.t.assert_term_exists(ref)
-        termset = self.t.get_related(ref)
-        return SimpleTerm.from_termset(termset)
-
-    def search(self, s: str) -> Termset:
-        """Find terms matching a user-given incremental (startswith) search string."""
-        qws = list(Tokenizer.split(s.lower()))
-
-        def match(label: str) -> float:
-            lws = Tokenizer.split(label.lower())
-            for i, lw in enumerate(lws):
-                if any(lw.startswith(qw) for qw in qws):
-                    # Score more if match appears early in label
-                    return 10 - min(i, 5)
-            return 0
-
-
-        hits = dict()
-        def add_hit(ref, score):
-            if not ref in hits:
-                hits[ref] = 0
-            hits[ref] = max(hits[ref], score)
-
-        # The different label fields should give different scores
-        fields = {
-            SKOS.prefLabel: 1,
-            SKOS.altLabel: .8,
-            SKOS.hiddenLabel: .6,
-        }
-
-        # Check all QLIT/Homosaurus terms
-        for ref in self.th.concepts():
-            for predicate, relevance in fields.items():
-                # Score each label against the search string
-                for label in self.th[ref:predicate]:
-                    score = match(label) * relevance
-                    if not score: continue
-
-                    # Is a QLIT term: Record score for it
-                    if (ref.startswith("https://queerlit")):
-                        add_hit(ref, score)
-                    # Is a Homosaurus term: Record score for the matching QLIT term
-                    for sref in self.th.subjects(SKOS.exactMatch, ref):
-                        add_hit(sref, score * .8)
-                    for sref in self.th.subjects(SKOS.closeMatch, ref):
-                        add_hit(sref, score * .5)
+        record = self.store.records[self.store.find(other)]
+        return self.from_numbers(self.store.terms(record.related))
+
+    def get_broader_transitive(self, narrower: str, limit=None, offset=0) -> list[SimpleTerm]:
+        """Find all terms broader than a term, directly broader first, or a page of them."""
+        numbers = self.store.broader_transitive(self.store.find(narrower))
+        return paginate(self.in_order(numbers), limit, offset)
+
+    def get_narrower_transitive(self, broader: str, limit=None, offset=0) -> list[SimpleTerm]:
+        """Find all terms narrower than a term, directly narrower first, or a page of them."""
+        numbers = self.store.narrower_transitive(self.store.find(broader))
+        return paginate(self.in_order(numbers), limit, offset)
+
+    def in_order(self, numbers) -> list[SimpleTerm]:
+        """Look up simple dicts for the given terms, in the same order, leaving out deprecated terms."""
+        records = self.store.records
+        return [self.terms[number] for number in numbers if not records[number].deprecated]
+
+    def search(self, s: str, limit: int = None, offset: int = 0, fuzzy=False) -> list[SimpleTerm]:
+        """Find terms matching a user-given incremental (startswith) search string, optionally fuzzily.
+
+        Hits are ordered by score, then label. With a limit, only the best hits up to
+        the end of the page are picked and ordered."""
+        hits = []
+        for ref, score in self.search_cache.search(s, fuzzy).items():
+            number = self.store.number(ref)
+            if number is not None:
+                hits.append((number, score))
+
+        def rank(hit):
+            return -hit[1], self.terms[hit[0]]['prefLabel']
+        if limit is None:
+            hits.sort(key=rank)
+        else:
+            hits = heapq.nsmallest(offset + limit, hits, key=rank)
 
         scored_hits = []
-        for ref, score in hits.items():
-            if self.th.value(ref, OWL.deprecated): continue
-            term = SimpleTerm.from_subject(self.t, ref)
+        for number, score in hits[offset:]:
+            term = SimpleTerm(self.terms[number])
             term['score'] = score
             scored_hits.append(term)
-
-        scored_hits.sort(key=lambda term: term['prefLabel'])
-        scored_hits.sort(key=lambda term: term['score'], reverse=True)
         return scored_hits
 
     def get_collections(self):
-        g = self.t.get_collections()
+        records = self.store.records
         dicts = [dict(
-            name=ref_to_name(ref),
-            uri=str(ref),
-            prefLabel=g.value(ref, SKOS.prefLabel),
-        ) for ref in g.collections()]
+            name=records[number].name,
+            uri=records[number].uri,
+            prefLabel=records[number].prefLabel,
+        ) for number in self.store.collections]
         dicts.sort(key=lambda term: term['prefLabel'].lower())
         return dicts
 
-    def get_collection(self, name, tree=False):
-        ref = name_to_ref(name)
-        self.t.assert_term_exists(ref)
-        termset = self.t.terms_if(lambda term: self.t[ref:SKOS.member:term])
-        terms = SimpleTerm.from_termset(termset)
+    def get_collection(self, name, tree=False, depth=None, limit=None, offset=0):
+        record = self.store.records[self.store.find(name)]
+        terms = paginate(self.from_numbers(self.store.terms(record.members)), limit, offset)
         if tree:
-            self.expand_narrower(terms)
+            terms = self.expand_narrower(terms, depth)
         return terms
 
-    def get_labels(self):
-        """All term labels, keyed by corresponding term identifiers."""
-        return dict((ref_to_name(name), label) for (name, label) in self.t.subject_objects(SKOS.prefLabel))
-
-    def expand_narrower(self, terms: list[SimpleTerm]):
-        """Instead of string names, look up and inflate narrower terms recursively."""
-        for term in terms:
-            expanded = []
-            for name in term["narrower"]:
-                expanded.append(self.get(name))
-            self.expand_narrower(expanded)
-            term["narrower"] = expanded
+    def export(self, collection: str = None, roots=False, deprecated=False) -> Iterator[SimpleTerm]:
+        """Iterate over all concepts, or only those in a collection and/or without parents."""
+        store = self.store
+        numbers = store.concepts
+        if collection:
+            members = set(store.records[store.find(collection)].members)
+            numbers = [number for number in numbers if number in members]
+        if roots:
+            root_numbers = set(store.roots)
+            numbers = [number for number in numbers if number in root_numbers]
+        if not deprecated:
+            numbers = [number for number in numbers if not store.records[number].deprecated]
+        return (self.terms[number] for number in numbers)
+
+    def get_labels(self, limit=None, offset=0):
+        """All term labels, keyed by corresponding term identifiers, or a page of them."""
+        labels = self.store.labels.items()
+        return dict(islice(labels, offset, None if limit is None else offset + limit))
+
+    @timed('simple')
+    def expand_narrower(self, terms: list[SimpleTerm], depth: int = None) -> list[SimpleTerm]:
+        """Instead of string names, look up and inflate narrower terms recursively, optionally down to a max depth."""
+        numbers = [self.store.numbers[term['name']] for term in terms]
+        if depth is None:
+            return [self.trees[number] for number in numbers]
+        if depth <= 0:
+            return [self.terms[number] for number in numbers]
+        expanded = []
+        for number in numbers:
+            tree = SimpleTerm(self.trees[number])
+            tree['narrower'] = self.expand_narrower(tree['narrower'], depth - 1)
+            expanded.append(tree)
+        return expanded
@@ -1,5 +1,6 @@
+from collections import defaultdict
 from os.path import basename
-from rdflib import Graph, SKOS, RDF, DCTERMS
+from rdflib import Graph, SKOS, DCTERMS, URIRef
 from qlit.thesaurus import Thesaurus
 from collections.abc import Generator
 
@@ -12,40 +13,165 @@ def skos_validate_partial(g: Graph) -> Generator[str]:
       yield f'Predicate ends with colon: "{p}"'
 
 
-def skos_validate_graph(g: Thesaurus) -> Generator[str]:
-  for term in g.refs():
-    for rel in [SKOS.broader, SKOS.narrower, SKOS.related]:
-      for other in g.objects(term, rel):
-        if not g[other:RDF.type:SKOS.Concept]:
-          yield f'No such concept {basename(other)}, {basename(rel)} of {basename(term)}'
-    if g.value(term, SKOS.hasTopConcept):
-      yield f'Concept {basename(term)} must not have `hasTopConcept`'
+def skos_validate_graph(g: Thesaurus, locations: dict[URIRef, str] = None, scope: set[URIRef] = None) -> Generator[str]:
+  """Find all errors in a thesaurus, optionally prefixed by where the term is defined.
+
+  If a `scope` of terms is given, only find errors involving them: in their relations,
+  in either direction, and in broader cycles through them."""
+  locations = locations or dict()
+
+  def error(term, message):
+    return f'{locations[term]}: {message}' if term in locations else message
+
+  terms = set(g.refs())
+  concepts = set(g.concepts())
+
+  for rel in [SKOS.broader, SKOS.narrower, SKOS.related]:
+    for term, other in relations(g, rel, scope):
+      if term in terms and other not in concepts:
+        yield error(term, f'No such concept {basename(other)}, {basename(rel)} of {basename(term)}')
+
+  for term, _ in relations(g, SKOS.hasTopConcept, scope):
+    if term in terms:
+      yield error(term, f'Concept {basename(term)} must not have `hasTopConcept`')
+
+  # Broader relations in both directions, as they are before completion
+  broader = broader_index(g, concepts, scope)
+  for cycle in find_cycles(broader):
+    yield error(cycle[0], f'Broader cycle: {" > ".join(basename(term) for term in cycle)}')
+
+
+def skos_warn_graph(g: Thesaurus, locations: dict[URIRef, str] = None, scope: set[URIRef] = None) -> Generator[str]:
+  """Find problems that do not stop the build, optionally prefixed by where the term is defined.
+
+  If a `scope` of terms is given, only find problems involving them."""
+  locations = locations or dict()
+  concepts = set(g.concepts())
+  pairs = list(relations(g, SKOS.related, scope))
+  broader = broader_index(g, concepts, None if scope is None else set(term for pair in pairs for term in pair))
+  seen = set()
+  for term, other in pairs:
+    pair = frozenset((term, other))
+    if term in concepts and other in concepts and pair not in seen:
+      seen.add(pair)
+      if other in ancestors(broader, term) or term in ancestors(broader, other):
+        message = f'Concept {basename(term)} is both related and broader/narrower to {basename(other)}'
+        yield f'{locations[term]}: {message}' if term in locations else message
+
+
+def relations(g: Graph, rel: URIRef, scope: set[URIRef] = None) -> list[tuple[URIRef, URIRef]]:
+  """Subjects and objects of a relation, or only those where either is in the scope."""
+  if scope is None:
+    return list(g.subject_objects(rel))
+  # As dict keys, to keep the order and skip pairs found in both directions
+  pairs = dict()
+  for term in scope:
+    pairs.update(((term, other), None) for other in g.objects(term, rel))
+    pairs.update(((other, term), None) for other in g.subjects(rel, term))
+  return list(pairs)
+
+
+def broader_index(g: Graph, concepts: set[URIRef], scope: set[URIRef] = None) -> dict[URIRef, set[URIRef]]:
+  """Broader concepts of each concept, from both `broader` and `narrower` statements.
+
+  If a `scope` of terms is given, only of those and of their broader concepts, transitively."""
+  broader = defaultdict(set)
+  if scope is None:
+    for term, other in g.subject_objects(SKOS.broader):
+      if term in concepts and other in concepts:
+        broader[term].add(other)
+    for term, other in g.subject_objects(SKOS.narrower):
+      if term in concepts and other in concepts:
+        broader[other].add(term)
+    return broader
+
+  todo = [term for term in scope if term in concepts]
+  while todo:
+    term = todo.pop()
+    if term in broader:
+      continue
+    broader[term] = set(other for other in g.objects(term, SKOS.broader) if other in concepts)
+    broader[term].update(other for other in g.subjects(SKOS.narrower, term) if other in concepts)
+    todo.extend(broader[term])
+  return broader
+
+
+def find_cycles(broader: dict[URIRef, set[URIRef]]) -> Generator[list[URIRef]]:
+  """Find cycles of broader relations, each as a list of terms starting and ending with the same term."""
+  done = set()
+  for start in list(broader):
+    if start in done:
+      continue
+    # Depth-first, keeping the current path of terms and their unvisited broader terms
+    path = [start]
+    todo = [iter(sorted(broader[start]))]
+    on_path = {start}
+    while todo:
+      other = next(todo[-1], None)
+      if other is None:
+        todo.pop()
+        term = path.pop()
+        on_path.remove(term)
+        done.add(term)
+        continue
+      if other in on_path:
+        yield path[path.index(other):] + [other]
+      elif other not in done:
+        path.append(other)
+        on_path.add(other)
+        todo.append(iter(sorted(broader.get(other, ()))))
+
+
+def ancestors(broader: dict[URIRef, set[URIRef]], term: URIRef) -> set[URIRef]:
+  """All broader terms of a term, transitively."""
+  found = set()
+  todo = list(broader.get(term, ()))
+  while todo:
+    other = todo.pop()
+    if other not in found:
+      found.add(other)
+      todo.extend(broader.get(other, ()))
+  return found
 
 
 def skos_complete_graph(g: Thesaurus) -> None:
+  additions = []
+  removals = []
+  concepts = set(g.concepts())
+
   for term in g.refs():
     # set inScheme
-    g.set((term, SKOS.inScheme, g.scheme))
+    removals += [(term, SKOS.inScheme, o) for o in g.objects(term, SKOS.inScheme) if o != g.scheme]
+    additions.append((term, SKOS.inScheme, g.scheme))
+
+  # broader <-> narrower
+  for term, broader in g.subject_objects(SKOS.broader):
+    if term in concepts:
+      additions.append((broader, SKOS.narrower, term))
+  for term, narrower in g.subject_objects(SKOS.narrower):
+    if term in concepts:
+      additions.append((narrower, SKOS.broader, term))
 
+  # related <-> related
+  for term, relatee in g.subject_objects(SKOS.related):
+    if term in concepts:
+      additions.append((relatee, SKOS.related, term))
+
+  # topConceptOf <-> hasTopConcept
+  has_broader = set(g.subjects(SKOS.broader)) | set(s for s, p, o in additions if p == SKOS.broader)
+  removals += [(term, p, o) for term, p, o in g.triples((None, SKOS.topConceptOf, None)) if term in concepts]
   for term in g.concepts():
-    # broader <-> narrower
-    for broader in g[term:SKOS.broader]:
-      g.add((broader, SKOS.narrower, term))
-    for narrower in g[term:SKOS.narrower]:
-      g.add((narrower, SKOS.broader, term))
-
-    # related <-> related
-    for relatee in g[term:SKOS.related]:
-      g.add((relatee, SKOS.related, term))
-
-    # topConceptOf <-> hasTopConcept
-    g.remove((term, SKOS.topConceptOf, None))
-    if not g.value(term, SKOS.broader):
-      g.set((term, SKOS.topConceptOf, g.scheme))
-      g.add((g.scheme, SKOS.hasTopConcept, term))
-
-    # replaces <-> isReplacedBy
-    for replaced in g[term:DCTERMS.replaces]:
-      g.add((replaced, DCTERMS.isReplacedBy, term))
-    for replacer in g[term:DCTERMS.isReplacedBy]:
-      g.add((replacer, DCTERMS.replaces, term))
\ No newline at end of file
+    if term not in has_broader:
+      additions.append((term, SKOS.topConceptOf, g.scheme))
+      additions.append((g.scheme, SKOS.hasTopConcept, term))
+
+  # replaces <-> isReplacedBy
+  for term, replaced in g.subject_objects(DCTERMS.replaces):
+    if term in concepts:
+      additions.append((replaced, DCTERMS.isReplacedBy, term))
+  for term, replacer in g.subject_objects(DCTERMS.isReplacedBy):
+    if term in concepts:
+      additions.append((replacer, DCTERMS.replaces, term))
+
+  g -= removals
+  g.addN((s, p, o, g) for s, p, o in additions)
@@ -0,0 +1,225 @@
+"""
+Binary snapshots of thesaurus files, for loading faster than parsing RDF.
+
+`build.py` writes a snapshot next to each thesaurus file it writes or parses.
+Loading only reads snapshots. A snapshot records a hash of its RDF file, so that
+an outdated snapshot is ignored and the RDF file parsed instead.
+
+A snapshot is a short JSON header, followed by the triples as numbers in a table
+of nodes, and the table itself: the kind of each node, and the numbers of its
+value and language or datatype in a table of strings. Numbers are unsigned 32-bit
+integers, and strings are UTF-8 text with a table of their lengths. The snapshot
+is memory-mapped when loading, and the tables are read from the mapping.
+"""
+
+from array import array
+from hashlib import sha256
+from itertools import accumulate
+import json
+from mmap import ACCESS_READ, mmap
+import os
+import re
+from struct import Struct
+import sys
+from time import perf_counter
+from typing import Iterable
+from rdflib import BNode, Literal, URIRef
+from .thesaurus import Thesaurus
+
+# Increment when the snapshot contents change in incompatible ways.
+FORMAT = 2
+
+MAGIC = b'QLITSNAP'
+# The magic bytes and the length of the JSON header that follows
+PREFIX = Struct('<8sI')
+
+# Kinds of nodes
+URI, BNODE, LITERAL, LANG_LITERAL, TYPED_LITERAL = range(5)
+
+URI_PARTS = re.compile(r'(.*[/#]|)(.*)', re.DOTALL)
+
+# Seconds taken by `load_thesaurus`, by path
+LOAD_TIMES: dict[str, float] = dict()
+
+
+def snapshot_path(path: str) -> str:
+    return path + '.snapshot'
+
+
+def file_hash(path: str) -> str:
+    with open(path, 'rb') as f:
+        return sha256(f.read()).hexdigest()
+
+
+def layout(header: dict, start: int) -> dict[str, slice]:
+    """Where each table of a snapshot is, after its header."""
+    sizes = dict(
+        triples=4 * header['triples'],
+        values=4 * header['nodes'],
+        extras=4 * header['nodes'],
+        lengths=4 * header['strings'],
+        kinds=header['nodes'],
+        text=header['text'],
+    )
+    tables = dict()
+    for name, size in sizes.items():
+        tables[name] = slice(start, start + size)
+        start += size
+    return tables
+
+
+def node_parts(node) -> tuple[int, str, str]:
+    """The kind of a node, its value, and its language or datatype if any.
+
+    For a URI, the value is only the last part, and the extra is the namespace,
+    so that a namespace is stored once."""
+    if isinstance(node, Literal):
+        if node.language:
+            return LANG_LITERAL, str(node), node.language
+        if node.datatype:
+            return TYPED_LITERAL, str(node), str(node.datatype)
+        return LITERAL, str(node), ''
+    if isinstance(node, BNode):
+        return BNODE, str(node), ''
+    namespace, local = URI_PARTS.match(node).groups()
+    return URI, local, namespace
+
+
+def make_node(kind: int, value: str, extra: str):
+    if kind == URI:
+        return URIRef(extra + value)
+    if kind == LANG_LITERAL:
+        return Literal(value, lang=extra)
+    if kind == TYPED_LITERAL:
+        return Literal(value, datatype=extra)
+    if kind == LITERAL:
+        return Literal(value)
+    return BNode(value)
+
+
+class RecordingThesaurus(Thesaurus):
+    """A thesaurus that remembers the order in which triples were added."""
+
+    def __init__(self, *args, **kwargs):
+        self.added = []
+        super().__init__(*args, **kwargs)
+
+    def add(self, triple):
+        self.added.append(triple)
+        return super().add(triple)
+
+
+def save_snapshot(g: Thesaurus, path: str, triples: Iterable) -> None:
+    """Save a snapshot of a thesaurus, which was just written to or parsed from `path`.
+
+    Give the `triples` of the thesaurus in the order of the file, e.g. `g.added` if
+    it was parsed as a `RecordingThesaurus`. The loaded snapshot adds them in that
+    order, so that it iterates and serializes the same way as the parsed file."""
+    strings = dict()
+    nodes = dict()
+    kinds = bytearray()
+    values = array('I')
+    extras = array('I')
+    numbers = array('I')
+    for triple in triples:
+        for node in triple:
+            number = nodes.get(node)
+            if number is None:
+                number = nodes[node] = len(nodes)
+                kind, value, extra = node_parts(node)
+                kinds.append(kind)
+                values.append(strings.setdefault(value, len(strings)))
+                extras.append(strings.setdefault(extra, len(strings)))
+            numbers.append(number)
+    lengths = array('I', map(len, strings))
+    text = ''.join(strings).encode('utf-8')
+
+    header = json.dumps(dict(
+        format=FORMAT,
+        source=file_hash(path),
+        byteorder=sys.byteorder,
+        namespaces=[(prefix, str(namespace)) for prefix, namespace in g.namespaces()],
+        triples=len(numbers),
+        nodes=len(nodes),
+        strings=len(strings),
+        text=len(text),
+    )).encode('utf-8')
+    # Pad the header, to align the numbers after it
+    header += b' ' * (-len(header) % 4)
+
+    tmp_path = snapshot_path(path) + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(PREFIX.pack(MAGIC, len(header)))
+        f.write(header)
+        # In the order of `layout`
+        for table in numbers, values, extras, lengths, kinds, text:
+            f.write(table)
+    os.replace(tmp_path, snapshot_path(path))
+
+
+def current_header(data, path: str) -> dict | None:
+    """The header of a snapshot, unless it is in another format or made from another version of `path`."""
+    magic, size = PREFIX.unpack_from(data)
+    if magic != MAGIC:
+        return None
+    header = json.loads(bytes(data[PREFIX.size:PREFIX.size + size]))
+    if (header['format'], header['source'], header['byteorder']) != (FORMAT, file_hash(path), sys.byteorder):
+        return None
+    header['start'] = PREFIX.size + size
+    return header
+
+
+def has_snapshot(path: str) -> bool:
+    """Whether `path` has an up to date snapshot."""
+    try:
+        with open(snapshot_path(path), 'rb') as f, mmap(f.fileno(), 0, access=ACCESS_READ) as data:
+            return current_header(data, path) is not None
+    except Exception:
+        return False
+
+
+def read_snapshot(path: str) -> Thesaurus | None:
+    """Load a thesaurus from the snapshot of `path`, unless it is missing or stale."""
+    try:
+        with open(snapshot_path(path), 'rb') as f, mmap(f.fileno(), 0, access=ACCESS_READ) as data:
+            header = current_header(data, path)
+            if header is None:
+                return None
+            return read_tables(data, header)
+    except Exception:
+        # Missing or unreadable, just parse the RDF file instead.
+        return None
+
+
+def read_tables(data: mmap, header: dict) -> Thesaurus:
+    tables = layout(header, header['start'])
+    with memoryview(data) as view, \
+            view[tables['triples']].cast('I') as triples, \
+            view[tables['values']].cast('I') as values, \
+            view[tables['extras']].cast('I') as extras, \
+            view[tables['lengths']].cast('I') as lengths:
+        text = str(view[tables['text']], 'utf-8')
+        ends = list(accumulate(lengths))
+        strings = [text[start:end] for start, end in zip([0] + ends, ends)]
+        nodes = [make_node(kind, strings[value], strings[extra])
+                 for kind, value, extra in zip(data[tables['kinds']], values, extras)]
+
+        g = Thesaurus()
+        for prefix, namespace in header['namespaces']:
+            g.bind(prefix, namespace, override=True, replace=True)
+        g.addN((nodes[triples[i]], nodes[triples[i + 1]], nodes[triples[i + 2]], g)
+               for i in range(0, len(triples), 3))
+    return g
+
+
+def load_thesaurus(path: str) -> Thesaurus:
+    """Load a thesaurus file, from its snapshot if that is up to date."""
+    start = perf_counter()
+    source = 'snapshot'
+    g = read_snapshot(path)
+    if g is None:
+        source = 'parsed'
+        g = Thesaurus().parse(path)
+    LOAD_TIMES[path] = perf_counter() - start
+    print(f'Loaded {path} ({source}) with {len(g.refs())} terms in {LOAD_TIMES[path]:.2f} s')
+    return g
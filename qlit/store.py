@@ -0,0 +1,188 @@
+"""
+A compact, read-only store of the terms in a thesaurus, for serving.
+
+An rdflib graph keeps several indexes of node objects for every triple, but the
+server only reads a fixed set of SKOS fields. The store keeps those fields in
+slotted records, with relations as term numbers, and the triples of each subject
+pickled together. An rdflib graph is rebuilt from those only for RDF serialization.
+"""
+
+from array import array
+from itertools import accumulate
+from os.path import basename
+import pickle
+import sys
+from rdflib import OWL, SKOS, Graph, URIRef
+from .homosaurus import HOMOSAURUS_BASE, load_homosaurus
+from .metrics import timed
+from .search import SearchIndex
+from .snapshot import load_thesaurus
+from .thesaurus import BASE, TermNotFoundError, Termset, Thesaurus, transitive
+
+
+class TermRecord:
+    """The served fields of a term. Relations are numbers of terms (or other resources) in the store."""
+
+    __slots__ = ('name', 'uri', 'concept', 'collection', 'deprecated',
+                 'prefLabel', 'altLabels', 'hiddenLabels', 'scopeNote',
+                 'broader', 'narrower', 'related', 'members', 'exactMatch', 'closeMatch')
+
+    def __init__(self, **fields):
+        for name, value in fields.items():
+            setattr(self, name, value)
+
+
+class ExternalTerm:
+    """A matched term outside QLIT. Only Homosaurus terms have labels."""
+
+    __slots__ = ('uri', 'prefLabel', 'altLabels')
+
+    def __init__(self, uri: str, prefLabel: str | None = None, altLabels: tuple[str, ...] = ()):
+        self.uri = uri
+        self.prefLabel = prefLabel
+        self.altLabels = altLabels
+
+
+class TermStore:
+    """The terms of a thesaurus, with the labels of matched Homosaurus terms.
+
+    Terms are numbered in the order of `Thesaurus.refs()`, so concepts come
+    before collections. Resources that are related to but are not terms get
+    the numbers after that."""
+
+    def __init__(self, thesaurus: Thesaurus, homosaurus: Graph):
+        self.version = thesaurus.version
+        strings: dict[str, str] = dict()
+
+        def text(value) -> str | None:
+            # Share equal strings, as many labels recur
+            return None if value is None else strings.setdefault(str(value), str(value))
+
+        refs = thesaurus.refs()
+        numbers = dict((ref, i) for i, ref in enumerate(refs))
+        self.names: list[str] = [sys.intern(basename(ref)) for ref in refs]
+        # Term names to numbers, like `Termset.find`
+        self.numbers: dict[str, int] = dict((name, i) for i, name in enumerate(self.names))
+
+        def number(ref: URIRef) -> int:
+            if ref not in numbers:
+                numbers[ref] = len(self.names)
+                self.names.append(sys.intern(basename(ref)))
+            return numbers[ref]
+
+        self.externals: list[ExternalTerm] = []
+        external_numbers: dict[URIRef, int] = dict()
+
+        def external(ref: URIRef) -> int:
+            if ref not in external_numbers:
+                external_numbers[ref] = len(self.externals)
+                term = ExternalTerm(str(ref))
+                if ref.startswith(HOMOSAURUS_BASE):
+                    term.prefLabel = text(str(homosaurus.value(ref, SKOS.prefLabel)))
+                    term.altLabels = tuple(text(l) for l in homosaurus.objects(ref, SKOS.altLabel))
+                self.externals.append(term)
+            return external_numbers[ref]
+
+        concepts = set(thesaurus.concepts())
+        collections = set(thesaurus.collections())
+        self.records: list[TermRecord] = []
+        for i, ref in enumerate(refs):
+            self.records.append(TermRecord(
+                name=self.names[i],
+                uri=str(ref),
+                concept=ref in concepts,
+                collection=ref in collections,
+                deprecated=bool(thesaurus.value(ref, OWL.deprecated)),
+                prefLabel=text(thesaurus.value(ref, SKOS.prefLabel)),
+                altLabels=tuple(text(l) for l in thesaurus.objects(ref, SKOS.altLabel)),
+                hiddenLabels=tuple(text(l) for l in thesaurus.objects(ref, SKOS.hiddenLabel)),
+                scopeNote=text(thesaurus.value(ref, SKOS.scopeNote)),
+                broader=tuple(number(o) for o in thesaurus.objects(ref, SKOS.broader)),
+                narrower=tuple(number(o) for o in thesaurus.objects(ref, SKOS.narrower)),
+                related=tuple(number(o) for o in thesaurus.objects(ref, SKOS.related)),
+                members=tuple(number(o) for o in thesaurus.objects(ref, SKOS.member)),
+                exactMatch=tuple(external(o) for o in thesaurus.objects(ref, SKOS.exactMatch)),
+                closeMatch=tuple(external(o) for o in thesaurus.objects(ref, SKOS.closeMatch)),
+            ))
+
+        # Concepts are numbered first, see `Termset.refs()`
+        self.concepts = range(len(concepts))
+        self.collections = array('I', (numbers[ref] for ref in thesaurus.collections()))
+        self.roots = array('I', (i for i in self.concepts if not self.records[i].broader))
+
+        # Labels of all resources, also the concept scheme
+        self.labels: dict[str, str] = dict((basename(s), text(l))
+                                           for s, l in thesaurus.subject_objects(SKOS.prefLabel))
+
+        # The triples of each subject, terms first, in the order of the graph's own index so
+        # that a rebuilt graph lists objects in the same order. Unpickling is faster than parsing.
+        subjects = refs + [s for s in dict.fromkeys(thesaurus.subjects()) if s not in numbers]
+        chunks = [pickle.dumps(list(thesaurus.triples((s, None, None))), protocol=pickle.HIGHEST_PROTOCOL)
+                  for s in subjects]
+        self.triples = b''.join(chunks)
+        self.starts = array('L', accumulate((len(chunk) for chunk in chunks), initial=0))
+        self.namespaces = list(thesaurus.namespaces())
+
+        # Search labels of matched Homosaurus terms too. The merged graph is only needed for indexing.
+        merged = Thesaurus()
+        merged += thesaurus
+        merged += homosaurus
+        self.search_index = SearchIndex(merged)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    @timed('find')
+    def find(self, name: str) -> int:
+        """Get the number of a term by its name (the last part of the URI)."""
+        number = self.numbers.get(name)
+        if number is None:
+            raise TermNotFoundError(URIRef(BASE + name))
+        return number
+
+    def number(self, ref: URIRef) -> int | None:
+        """Get the number of a term by its URIRef, if it is a term."""
+        number = self.numbers.get(basename(ref))
+        if number is None or self.records[number].uri != str(ref):
+            return None
+        return number
+
+    def terms(self, numbers) -> list[int]:
+        """Leave out anything but terms from some related numbers."""
+        return [number for number in numbers if number < len(self.records)]
+
+    def label_key(self, number: int) -> str:
+        return str(self.records[number].prefLabel).lower()
+
+    def broader_transitive(self, number: int) -> list[int]:
+        """Terms broader than a term, directly or indirectly, nearest first and then by label."""
+        return transitive(number, lambda n: self.terms(self.records[n].broader), self.label_key)
+
+    def narrower_transitive(self, number: int) -> list[int]:
+        """Terms narrower than a term, directly or indirectly, nearest first and then by label."""
+        return transitive(number, lambda n: self.terms(self.records[n].narrower), self.label_key)
+
+    def read_triples(self, i: int) -> list[tuple]:
+        """Unpickle the triples of the i:th subject (which is the i:th term, for terms)."""
+        return pickle.loads(self.triples[self.starts[i]:self.starts[i + 1]])
+
+    def termset(self, number: int) -> Termset:
+        """A graph with the triples of a term, like `Thesaurus.get`. It is empty if the term is deprecated."""
+        g = Termset(base=BASE)
+        if not self.records[number].deprecated:
+            g.addN((s, p, o, g) for s, p, o in self.read_triples(number))
+        return g
+
+    def graph(self) -> Thesaurus:
+        """Rebuild the full thesaurus graph."""
+        g = Thesaurus()
+        for prefix, namespace in self.namespaces:
+            g.bind(prefix, namespace, override=True, replace=True)
+        g.addN((s, p, o, g) for i in range(len(self.starts) - 1) for s, p, o in self.read_triples(i))
+        return g
+
+
+def load_store(path: str, homosaurus_path: str, subset_path: str) -> TermStore:
+    """Load a thesaurus file and the Homosaurus terms it links to into a store."""
+    thesaurus = load_thesaurus(path)
+    return TermStore(thesaurus, load_homosaurus(thesaurus, homosaurus_path, subset_path))
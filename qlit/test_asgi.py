@@ -0,0 +1,65 @@
+import asyncio
+from .asgi import AsgiAdapter, is_serialization
+
+def wsgi_app(environ, start_response):
+    start_response("200 OK", [("Content-Type", "text/plain"), ("X-Query", environ["QUERY_STRING"])])
+    body = environ["wsgi.input"].read()
+    return iter([environ["PATH_INFO"].encode("latin-1"), b"", b" ", body, b" " + environ.get("HTTP_ACCEPT", "").encode()])
+
+def request(app, path, query=b"", body=b""):
+    scope = dict(type="http", http_version="1.1", method="POST", path=path, query_string=query,
+                 headers=[(b"accept", b"text/turtle")])
+    messages = [dict(type="http.request", body=body[:2], more_body=True), dict(type="http.request", body=body[2:])]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    return sent
+
+def test_asgi_adapter():
+    app = AsgiAdapter(wsgi_app)
+    sent = request(app, "/api/tårta", b"s=a", b"hello")
+    assert sent[0] == dict(type="http.response.start", status=200,
+                           headers=[(b"content-type", b"text/plain"), (b"x-query", b"s=a")])
+    assert b"".join(message["body"] for message in sent[1:]) == "/api/tårta hello text/turtle".encode()
+    assert all(message["more_body"] for message in sent[1:-1])
+    assert not sent[-1].get("more_body")
+
+def test_asgi_adapter_routing():
+    app = AsgiAdapter(wsgi_app)
+    called = []
+    def recording(name):
+        async def asgi_app(scope, receive, send):
+            called.append((name, scope["path"]))
+        return asgi_app
+    app.api, app.serialize = recording("api"), recording("serialize")
+    request(app, "/api/term/food")
+    request(app, "/food")
+    assert called == [("api", "/api/term/food"), ("serialize", "/food")]
+
+def test_asgi_adapter_lifespan():
+    started = []
+    app = AsgiAdapter(wsgi_app, on_startup=lambda: started.append(True))
+    messages = [dict(type="lifespan.startup"), dict(type="lifespan.shutdown")]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message["type"])
+
+    asyncio.run(app(dict(type="lifespan"), receive, send))
+    assert started == [True]
+    assert sent == ["lifespan.startup.complete", "lifespan.shutdown.complete"]
+
+def test_is_serialization():
+    assert is_serialization("/")
+    assert is_serialization("/ab12cd34")
+    assert not is_serialization("/api/term/ab12cd34")
+    assert not is_serialization("/metrics")
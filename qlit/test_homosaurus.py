@@ -0,0 +1,45 @@
+from rdflib import Literal, RDF, SKOS, URIRef
+from .homosaurus import is_current, load_homosaurus, write_subset
+from .simple import name_to_ref
+from .thesaurus import Thesaurus
+
+TTL = """@prefix skos: <http://www.w3.org/2004/02/skos/core#> .
+<https://homosaurus.org/v3/meal> a skos:Concept ;
+    skos:prefLabel "Meal" ;
+    skos:altLabel "Dinner", "Breakfast" ;
+    skos:related <https://homosaurus.org/v3/snack> .
+<https://homosaurus.org/v3/snack> a skos:Concept ;
+    skos:prefLabel "Snack" .
+"""
+
+def test_homosaurus_subset(tmp_path):
+    path, subset_path = str(tmp_path / "homosaurus.ttl"), str(tmp_path / "homosaurus.subset.nt")
+    with open(path, "w") as f:
+        f.write(TTL)
+    meal, snack = URIRef("https://homosaurus.org/v3/meal"), URIRef("https://homosaurus.org/v3/snack")
+    t = Thesaurus()
+    food = name_to_ref("food")
+    t.add((food, RDF.type, SKOS.Concept))
+    t.add((food, SKOS.exactMatch, meal))
+
+    # No subset yet, so all is loaded
+    assert not is_current(t, path, subset_path)
+    assert load_homosaurus(t, path, subset_path).refs() == [meal, snack]
+
+    # Only linked terms and their labels are kept, in order
+    assert write_subset(t, path, subset_path) == 1
+    assert is_current(t, path, subset_path)
+    h = load_homosaurus(t, path, subset_path)
+    assert h.refs() == [meal]
+    assert list(h.objects(meal, SKOS.altLabel)) == [Literal("Dinner"), Literal("Breakfast")]
+    assert h.value(meal, SKOS.related) is None
+
+    # Outdated when the thesaurus links to other terms, or Homosaurus changes
+    t.add((food, SKOS.closeMatch, snack))
+    assert not is_current(t, path, subset_path)
+    # An already parsed Homosaurus can be given
+    write_subset(t, path, subset_path, Thesaurus().parse(path))
+    assert load_homosaurus(t, path, subset_path).refs() == [meal, snack]
+    with open(path, "a") as f:
+        f.write('<https://homosaurus.org/v3/snack> skos:altLabel "Fika" .\n')
+    assert not is_current(t, path, subset_path)
@@ -0,0 +1,44 @@
+from . import metrics
+
+def test_timed_disabled(monkeypatch):
+    monkeypatch.setattr(metrics, "ENABLED", False)
+    def f():
+        pass
+    assert metrics.timed("phase")(f) is f
+
+def test_timed(monkeypatch):
+    monkeypatch.setattr(metrics, "ENABLED", True)
+    monkeypatch.setattr(metrics, "REGISTRY", metrics.Registry())
+
+    @metrics.timed("count")
+    def count(n):
+        return count(n - 1) + 1 if n else 0
+
+    # Outside of requests, nothing is recorded
+    assert count(3) == 3
+    assert metrics.REGISTRY.values == {}
+
+    timings = metrics.RequestTimings()
+    metrics.current.set(timings)
+    try:
+        assert count(3) == 3
+    finally:
+        metrics.current.set(None)
+    # Nested calls are counted once
+    assert list(timings.durations) == ["count"]
+    assert metrics.REGISTRY.values["qlit_phase_calls_total"] == {(("phase", "count"),): 1}
+    assert timings.header(.5).startswith("count;dur=")
+    assert timings.header(.5).endswith(", total;dur=500.000")
+
+def test_registry_render():
+    registry = metrics.Registry()
+    registry.inc("qlit_response_bytes_total", 10, mimetype="text/turtle")
+    registry.inc("qlit_response_bytes_total", 5, mimetype="text/turtle")
+    registry.observe("qlit_request_duration_seconds", .003, route='/a"b')
+    lines = registry.render().splitlines()
+    assert 'qlit_response_bytes_total{mimetype="text/turtle"} 15' in lines
+    assert "# TYPE qlit_request_duration_seconds histogram" in lines
+    assert 'qlit_request_duration_seconds_bucket{route="/a\\"b",le="0.0025"} 0' in lines
+    assert 'qlit_request_duration_seconds_bucket{route="/a\\"b",le="0.005"} 1' in lines
+    assert 'qlit_request_duration_seconds_bucket{route="/a\\"b",le="+Inf"} 1' in lines
+    assert 'qlit_request_duration_seconds_count{route="/a\\"b"} 1' in lines
@@ -0,0 +1,28 @@
+from rdflib import Graph, URIRef, Literal, RDF, SKOS
+from .ntriples import sorted_lines, write_sorted
+
+def make_graph():
+    g = Graph()
+    for i in range(20):
+        term = URIRef(f"https://queerlit.dh.gu.se/qlit/v1/t{i}")
+        g.add((term, RDF.type, SKOS.Concept))
+        g.add((term, SKOS.prefLabel, Literal(f"Term {i} \"åäö\"\n", lang="sv")))
+        g.add((term, SKOS.altLabel, Literal(f"T\\{i}\r")))
+        g.add((term, SKOS.notation, Literal(i)))
+    return g
+
+def test_sorted_lines():
+    g = make_graph()
+    expected = sorted(g.serialize(format="nt").splitlines(True))
+    assert list(sorted_lines(g)) == expected
+    # Sorting in chunks on disk gives the same result
+    assert list(sorted_lines(g, max_lines=7)) == expected
+    assert list(sorted_lines(g, max_lines=40)) == expected
+
+def test_write_sorted(tmp_path):
+    g = make_graph()
+    path = str(tmp_path / "thesaurus.nt")
+    write_sorted(g, path, max_lines=7)
+    with open(path, encoding="utf-8", newline="") as f:
+        assert f.read() == "".join(sorted_lines(g))
+    assert list(tmp_path.iterdir()) == [tmp_path / "thesaurus.nt"]
@@ -0,0 +1,79 @@
+import os
+import signal
+from time import sleep
+from .reload import RELOAD_SIGNAL, Reloader, Watcher, file_state
+
+def wait_for(condition, timeout=5):
+    for i in range(int(timeout / .01)):
+        if condition():
+            return True
+        sleep(.01)
+    return False
+
+def test_reload(tmp_path):
+    path = str(tmp_path / "data.txt")
+    with open(path, "w") as f:
+        f.write("1")
+    def load():
+        with open(path) as f:
+            return int(f.read())
+    reloader = Reloader(load, [path], interval=.02)
+    assert reloader.current == 1
+    assert reloader.state == file_state([path])
+
+    # Loading fails, the current data is kept
+    with open(path, "w") as f:
+        f.write("foo")
+    assert not reloader.reload()
+    assert reloader.current == 1
+
+    # Changes are picked up in the background
+    reloader.watch()
+    with open(path, "w") as f:
+        f.write("2")
+    os.utime(path, ns=(0, 0))
+    assert wait_for(lambda: reloader.current == 2)
+    assert reloader.reloads == 1
+
+def test_reload_first_load(tmp_path):
+    path = str(tmp_path / "data.txt")
+    with open(path, "w") as f:
+        f.write("1")
+    def first_load():
+        # The file is saved again while loading
+        with open(path, "w") as f:
+            f.write("22")
+        return 1
+    reloader = Reloader(lambda: 2, [path], interval=.02, first_load=first_load)
+    assert reloader.current == 1
+
+    # The change made while loading is picked up
+    reloader.watch()
+    assert wait_for(lambda: reloader.current == 2)
+
+def test_reload_signal(tmp_path):
+    values = iter(range(10))
+    reloader = Reloader(lambda: next(values), [str(tmp_path / "missing")], interval=0)
+    previous = signal.getsignal(RELOAD_SIGNAL)
+    try:
+        reloader.listen()
+        reloader.watch()
+        os.kill(os.getpid(), RELOAD_SIGNAL)
+        assert wait_for(lambda: reloader.current == 1)
+    finally:
+        signal.signal(RELOAD_SIGNAL, previous)
+
+def test_watcher(tmp_path):
+    path = str(tmp_path / "data.txt")
+    changes = []
+    watcher = Watcher([path], lambda: changes.append(file_state([path])), interval=.02)
+    watcher.watch()
+
+    # Called once the new file has stayed the same for a check. Written in one go, so that
+    # a check cannot see it half written.
+    with open(path + ".tmp", "w") as f:
+        f.write("1")
+    os.replace(path + ".tmp", path)
+    assert wait_for(lambda: changes == [file_state([path])])
+    sleep(.1)
+    assert len(changes) == 1
@@ -0,0 +1,88 @@
+from rdflib import URIRef, Literal, OWL, RDF, SKOS
+from .search import FUZZY_PENALTY, QueryCache, SearchIndex, fold, prefix_distance
+from .thesaurus import Thesaurus
+
+def test_fold():
+    assert fold("Kvinnorörelsen") == "kvinnororelsen"
+    assert fold("Åäö Éé") == "aao ee"
+
+def test_prefix_distance():
+    assert prefix_distance("kvin", "kvinnor", 1) == 0
+    assert prefix_distance("kvni", "kvinnor", 1) == 1
+    assert prefix_distance("kvnn", "kvinnor", 1) == 1
+    assert prefix_distance("kvinnnor", "kvinnor", 1) == 1
+    assert prefix_distance("kvxxnor", "kvinnor", 1) is None
+    assert prefix_distance("kvxxnor", "kvinnor", 2) == 2
+
+def test_search_index_prefixes():
+    assert list(SearchIndex.prefixes("Ab ac")) == [("a", 0), ("ab", 0), ("ac", 1)]
+
+def test_search_index():
+    t = Thesaurus()
+    food = URIRef("https://queerlit.dh.gu.se/qlit/v1/food")
+    fruit = URIRef("https://queerlit.dh.gu.se/qlit/v1/fruit")
+    old = URIRef("https://queerlit.dh.gu.se/qlit/v1/old")
+    meal = URIRef("https://homosaurus.org/v3/meal")
+    t.add((food, RDF.type, SKOS.Concept))
+    t.add((food, SKOS.prefLabel, Literal("Food")))
+    t.add((food, SKOS.altLabel, Literal("Things to eat")))
+    t.add((food, SKOS.exactMatch, meal))
+    t.add((fruit, RDF.type, SKOS.Concept))
+    t.add((fruit, SKOS.prefLabel, Literal("Fruit")))
+    t.add((fruit, SKOS.closeMatch, meal))
+    t.add((old, RDF.type, SKOS.Concept))
+    t.add((old, SKOS.prefLabel, Literal("Food (old)")))
+    t.add((old, OWL.deprecated, Literal(True)))
+    t.add((meal, RDF.type, SKOS.Concept))
+    t.add((meal, SKOS.prefLabel, Literal("Meal")))
+    index = SearchIndex(t)
+
+    assert index.search("fo") == {food: 10}
+    assert index.search("EAT") == {food: (10 - 2) * .8}
+    assert index.search("me") == {food: 10 * .8, fruit: 10 * .5}
+    assert index.search("fr me") == {food: 10 * .8, fruit: 10}
+    assert index.search("") == {}
+    assert index.search("xyz") == {}
+
+def test_search_index_fuzzy():
+    t = Thesaurus()
+    movement = URIRef("https://queerlit.dh.gu.se/qlit/v1/movement")
+    music = URIRef("https://queerlit.dh.gu.se/qlit/v1/music")
+    t.add((movement, RDF.type, SKOS.Concept))
+    t.add((movement, SKOS.prefLabel, Literal("Kvinnorörelsen")))
+    t.add((music, RDF.type, SKOS.Concept))
+    t.add((music, SKOS.prefLabel, Literal("Kvinnomusik")))
+    index = SearchIndex(t)
+
+    assert index.search("kvinnorore") == {}
+    # Diacritics are folded
+    assert index.search("kvinnorore", fuzzy=True) == {movement: 10}
+    # Typos score less
+    assert index.search("kvinnoxxrelsen", fuzzy=True) == {movement: 10 * FUZZY_PENALTY ** 2}
+    assert index.search("kvinomus", fuzzy=True) == {music: 10 * FUZZY_PENALTY}
+    # Exact prefix hits score as without fuzzy
+    assert index.search("kvinno", fuzzy=True) == index.search("kvinno")
+    assert index.search("xyz", fuzzy=True) == {}
+
+def test_query_cache():
+    t = Thesaurus()
+    homo = URIRef("https://queerlit.dh.gu.se/qlit/v1/homo")
+    home = URIRef("https://queerlit.dh.gu.se/qlit/v1/home")
+    for ref, label in [(homo, "Homosexualitet"), (home, "Hemmet")]:
+        t.add((ref, RDF.type, SKOS.Concept))
+        t.add((ref, SKOS.prefLabel, Literal(label)))
+    index = SearchIndex(t)
+    cache = QueryCache(index, maxsize=3)
+
+    for s in ["h", "ho", "hom", "homs", "homse", "homsex", "homsexu"]:
+        assert cache.search(s, fuzzy=True) == index.search(s, fuzzy=True)
+    assert cache.search("homsexu", fuzzy=True) == {homo: 10 * FUZZY_PENALTY}
+    info = cache.cache_info()
+    assert (info.hits, info.misses, info.currsize) == (1, 7, 3)
+
+    # Words are cached separately, in any order
+    assert cache.search("HOMSEXU homse", fuzzy=True) == index.search("homse homsexu", fuzzy=True)
+    assert cache.cache_info().hits == 3
+    # Least recently used words are evicted
+    cache.search("he")
+    assert ("homsex", True) not in cache.entries
@@ -0,0 +1,22 @@
+from rdflib import Graph, Literal, RDF, SKOS
+from .served import ServedData, prewarm
+from .simple import name_to_ref
+from .store import TermStore
+from .thesaurus import Thesaurus
+
+def test_served_data():
+    t = Thesaurus()
+    food = name_to_ref("food")
+    t.add((food, RDF.type, SKOS.Concept))
+    t.add((food, SKOS.prefLabel, Literal("Food")))
+    data = ServedData(TermStore(t, Graph()), {("food", "text/turtle"): b"prewarmed"})
+
+    # Prewarmed responses are taken into the cache
+    assert data.serialize.cache_info().currsize == 1
+    assert data.serialize("food", "text/turtle") == b"prewarmed"
+    assert b"Food" in data.serialize("food", "application/ld+json")
+    assert data.simple.get("food")["prefLabel"] == "Food"
+
+    # Prewarming is capped, starting with the full thesaurus
+    assert list(prewarm(data.store, 4)) == [(None, "text/turtle"), (None, "application/ld+json"),
+                                            (None, "application/rdf+xml"), ("food", "text/turtle")]
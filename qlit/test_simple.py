@@ -1,6 +1,7 @@
-from rdflib import URIRef, RDF, SKOS
+from pytest import raises
+from rdflib import URIRef, Literal, OWL, RDF, SKOS
 from .thesaurus import Thesaurus, Termset
-from .simple import SimpleThesaurus, SimpleTerm, ref_to_name, name_to_ref, Tokenizer
+from .simple import SimpleThesaurus, SimpleTerm, project, ref_to_name, name_to_ref, Tokenizer
 
 def test_tokenizer():
     assert list(Tokenizer.split("foo bar")) == ["foo", "bar"]
@@ -83,4 +84,126 @@ def test_simple_term_get_words():
     assert list(term.get_words()) == [
         "kvinnorörelser", "women", "s", "movement", "feminist", "movement",
         "kvinnorörelsen", "kvinno", "rörelser",
-    ]
\ No newline at end of file
+    ]
+
+def test_simple_thesaurus_terms():
+    t = Thesaurus()
+    food = name_to_ref("food")
+    t.add((food, RDF.type, SKOS.Concept))
+    t.add((food, SKOS.prefLabel, Literal("Food")))
+    ts = SimpleThesaurus(t)
+    term = ts.get("food")
+    assert term["prefLabel"] == "Food"
+    assert ts.get("food") is term
+
+    # The store is rebuilt when the thesaurus changes
+    t.set((food, SKOS.prefLabel, Literal("Mat")))
+    assert ts.get("food")["prefLabel"] == "Mat"
+
+def test_simple_thesaurus_trees():
+    t = Thesaurus()
+    food, fruit, apple, pome = (name_to_ref(name) for name in ["food", "fruit", "apple", "pome"])
+    for ref in [food, fruit, apple, pome]:
+        t.add((ref, RDF.type, SKOS.Concept))
+        t.add((ref, SKOS.prefLabel, Literal(ref_to_name(ref))))
+    t.add((food, SKOS.narrower, fruit))
+    t.add((food, SKOS.narrower, pome))
+    t.add((fruit, SKOS.narrower, apple))
+    t.add((pome, SKOS.narrower, apple))
+    # A cycle
+    t.add((apple, SKOS.narrower, food))
+    ts = SimpleThesaurus(t)
+
+    tree = ts.expand_narrower([ts.get("food")])[0]
+    assert [term["name"] for term in tree["narrower"]] == ["fruit", "pome"]
+    apple1 = tree["narrower"][0]["narrower"][0]
+    apple2 = tree["narrower"][1]["narrower"][0]
+    assert apple1["name"] == "apple"
+    assert apple1 is apple2
+    assert apple1["narrower"] == []
+    # The stored term is not modified
+    assert ts.get("food")["narrower"] == ["fruit", "pome"]
+
+    tree = ts.expand_narrower([ts.get("food")], depth=1)[0]
+    assert tree["narrower"][0]["name"] == "fruit"
+    assert tree["narrower"][0]["narrower"] == ["apple"]
+    assert ts.expand_narrower([ts.get("food")], depth=0)[0] == ts.get("food")
+
+def test_simple_thesaurus_transitive():
+    t = Thesaurus()
+    food, fruit, apple, pome = (name_to_ref(name) for name in ["food", "fruit", "apple", "pome"])
+    for ref in [food, fruit, apple, pome]:
+        t.add((ref, RDF.type, SKOS.Concept))
+        t.add((ref, SKOS.prefLabel, Literal(ref_to_name(ref))))
+    t.add((food, SKOS.narrower, fruit))
+    t.add((food, SKOS.narrower, pome))
+    t.add((fruit, SKOS.narrower, apple))
+    t.add((pome, SKOS.narrower, apple))
+    # A cycle
+    t.add((apple, SKOS.narrower, food))
+    ts = SimpleThesaurus(t)
+
+    # Transitive relations are listed nearest first, then by label
+    assert [term["name"] for term in ts.get_narrower_transitive("fruit")] == ["apple", "food", "pome"]
+    assert [term["name"] for term in ts.get_narrower_transitive("food")] == ["fruit", "pome", "apple"]
+    assert [term["name"] for term in ts.get_narrower_transitive("food", limit=1, offset=1)] == ["pome"]
+    assert ts.get_broader_transitive("apple") == []
+
+def test_simple_thesaurus_export():
+    t = Thesaurus()
+    food, fruit, old, vegetarian = (name_to_ref(name) for name in ["food", "fruit", "old", "vegetarian"])
+    for ref in [food, fruit, old]:
+        t.add((ref, RDF.type, SKOS.Concept))
+    t.add((vegetarian, RDF.type, SKOS.Collection))
+    t.add((vegetarian, SKOS.member, fruit))
+    t.add((vegetarian, SKOS.member, old))
+    t.add((fruit, SKOS.broader, food))
+    t.add((old, OWL.deprecated, Literal(True)))
+    ts = SimpleThesaurus(t)
+
+    def names(terms):
+        return [term["name"] for term in terms]
+    assert names(ts.export()) == ["food", "fruit"]
+    assert names(ts.export(deprecated=True)) == ["food", "fruit", "old"]
+    assert names(ts.export(roots=True)) == ["food"]
+    assert names(ts.export(collection="vegetarian")) == ["fruit"]
+    assert names(ts.export(collection="vegetarian", roots=True, deprecated=True)) == ["old"]
+
+def test_simple_thesaurus_get_many():
+    t = Thesaurus()
+    food, fruit, old = (name_to_ref(name) for name in ["food", "fruit", "old"])
+    for ref in [food, fruit, old]:
+        t.add((ref, RDF.type, SKOS.Concept))
+        t.add((ref, SKOS.prefLabel, Literal(ref_to_name(ref))))
+    t.add((fruit, SKOS.broader, food))
+    t.add((fruit, SKOS.related, old))
+    t.add((old, OWL.deprecated, Literal(True)))
+    ts = SimpleThesaurus(t)
+
+    terms = ts.get_many(["fruit", "missing", "food"])
+    assert list(terms) == ["fruit", "missing", "food"]
+    assert terms["fruit"] is ts.get("fruit")
+    assert terms["missing"] is None
+
+    terms = ts.get_many(["fruit"], expand=["broader", "related"])
+    assert terms["fruit"]["broader"] == [ts.get("food")]
+    # Deprecated terms are left out of expanded relations
+    assert terms["fruit"]["related"] == []
+    assert ts.get("fruit")["broader"] == ["food"]
+
+    with raises(ValueError):
+        ts.get_many(["fruit"], expand=["exactMatch"])
+
+def test_simple_thesaurus_search_limit():
+    hits = TS.search("kvinn")
+    assert len(hits) > 10
+    assert TS.search("kvinn", limit=10) == hits[:10]
+    assert TS.search("kvinn", limit=5, offset=3) == hits[3:8]
+    assert TS.search("kvinn", limit=0) == []
+
+def test_project():
+    tree = TS.expand_narrower([TS.get("um90bw50")])
+    projected = project(tree, ["name", "narrower"])
+    assert list(projected[0]) == ["name", "narrower"]
+    assert all(list(term) == ["name", "narrower"] for term in projected[0]["narrower"])
+    assert project(tree, None) is tree
@@ -1,5 +1,5 @@
 from rdflib import Graph, URIRef, Literal, DCTERMS, RDF, SKOS
-from .skos import skos_validate_partial, skos_validate_graph, skos_complete_graph
+from .skos import skos_validate_partial, skos_validate_graph, skos_warn_graph, skos_complete_graph
 from .thesaurus import Thesaurus
 
 def test_skos_validate_partial():
@@ -28,6 +28,49 @@ def test_skos_validate_graph():
     assert 'No such concept vegetable, core#related of fruit' in errors
     assert 'Concept fruit must not have `hasTopConcept`' in errors
 
+def test_skos_validate_graph_cycles():
+    t = Thesaurus()
+    for name in ["a", "b", "c", "d"]:
+        t.add((URIRef(name), RDF.type, SKOS.Concept))
+    t.add((URIRef("a"), SKOS.broader, URIRef("b")))
+    t.add((URIRef("c"), SKOS.narrower, URIRef("b")))
+    t.add((URIRef("c"), SKOS.broader, URIRef("a")))
+    t.add((URIRef("d"), SKOS.broader, URIRef("a")))
+
+    errors = list(skos_validate_graph(t, {URIRef("a"): "a.ttl"}))
+    assert errors == ['a.ttl: Broader cycle: a > b > c > a']
+
+def test_skos_validate_graph_scope():
+    t = Thesaurus()
+    for name in ["a", "b", "c", "d"]:
+        t.add((URIRef(name), RDF.type, SKOS.Concept))
+    t.add((URIRef("a"), SKOS.broader, URIRef("b")))
+    t.add((URIRef("b"), SKOS.broader, URIRef("a")))
+    t.add((URIRef("c"), SKOS.related, URIRef("removed")))
+    t.add((URIRef("d"), SKOS.broader, URIRef("c")))
+
+    assert len(list(skos_validate_graph(t))) == 2
+    # Only errors involving the terms in scope, also in relations to them
+    assert list(skos_validate_graph(t, scope={URIRef("d")})) == []
+    assert list(skos_validate_graph(t, scope={URIRef("removed")})) == ['No such concept removed, core#related of c']
+    assert list(skos_validate_graph(t, scope={URIRef("b")})) == ['Broader cycle: b > a > b']
+
+def test_skos_warn_graph():
+    t = Thesaurus()
+    for name in ["a", "b", "c"]:
+        t.add((URIRef(name), RDF.type, SKOS.Concept))
+    t.add((URIRef("a"), SKOS.broader, URIRef("b")))
+    t.add((URIRef("b"), SKOS.broader, URIRef("c")))
+    t.add((URIRef("c"), SKOS.related, URIRef("a")))
+    t.add((URIRef("a"), SKOS.related, URIRef("c")))
+
+    warnings = list(skos_warn_graph(t))
+    assert len(warnings) == 1
+    assert warnings[0] in [
+        'Concept a is both related and broader/narrower to c',
+        'Concept c is both related and broader/narrower to a',
+    ]
+
 def test_skos_complete_graph():
     t = Thesaurus()
     food = URIRef("https://queerlit.dh.gu.se/qlit/v1/food")
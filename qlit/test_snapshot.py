@@ -0,0 +1,60 @@
+from rdflib import URIRef, SKOS
+from .ntriples import nt_line, write_sorted
+from .snapshot import RecordingThesaurus, has_snapshot, load_thesaurus, read_snapshot, save_snapshot, snapshot_path
+from .thesaurus import Thesaurus
+
+NT = """<https://queerlit.dh.gu.se/qlit/v1/food> <http://www.w3.org/1999/02/22-rdf-syntax-ns#type> <http://www.w3.org/2004/02/skos/core#Concept> .
+<https://queerlit.dh.gu.se/qlit/v1/food> <http://www.w3.org/2004/02/skos/core#narrower> <https://queerlit.dh.gu.se/qlit/v1/fruit> .
+<https://queerlit.dh.gu.se/qlit/v1/fruit> <http://www.w3.org/1999/02/22-rdf-syntax-ns#type> <http://www.w3.org/2004/02/skos/core#Concept> .
+<https://queerlit.dh.gu.se/qlit/v1/fruit> <http://www.w3.org/2004/02/skos/core#prefLabel> "Frukt"@sv .
+<https://queerlit.dh.gu.se/qlit/v1/fruit> <http://purl.org/dc/terms/issued> "2023-01-01T00:00:00"^^<http://www.w3.org/2001/XMLSchema#dateTime> .
+<https://queerlit.dh.gu.se/qlit/v1/fruit> <http://www.w3.org/2004/02/skos/core#scopeNote> "Not \\"vegetables\\"\\n" .
+"""
+
+def test_snapshot(tmp_path):
+    path = str(tmp_path / "thesaurus.nt")
+    with open(path, "w") as f:
+        f.write(NT)
+    food = URIRef("https://queerlit.dh.gu.se/qlit/v1/food")
+    fruit = URIRef("https://queerlit.dh.gu.se/qlit/v1/fruit")
+
+    # No snapshot yet
+    assert read_snapshot(path) is None
+    assert not has_snapshot(path)
+
+    g = RecordingThesaurus().parse(path)
+    save_snapshot(g, path, g.added)
+    assert has_snapshot(path)
+    t = read_snapshot(path)
+    assert set(t) == set(g)
+    assert list(t) == list(Thesaurus().parse(path))
+    assert t.refs() == [food, fruit]
+    assert t.find("fruit") == fruit
+    assert t.value(fruit, SKOS.prefLabel).language == "sv"
+    assert t.index.narrower[food] == [fruit]
+    assert len(t.get_narrower(food)) == 4
+
+    # Stale snapshot is ignored, and not replaced when loading
+    with open(path, "a") as f:
+        f.write('<https://queerlit.dh.gu.se/qlit/v1/tofu> <http://www.w3.org/1999/02/22-rdf-syntax-ns#type> <http://www.w3.org/2004/02/skos/core#Concept> .\n')
+    assert read_snapshot(path) is None
+    assert len(load_thesaurus(path).refs()) == 3
+    assert read_snapshot(path) is None
+    assert not has_snapshot(path)
+
+    # Broken snapshot is ignored
+    with open(snapshot_path(path), "wb") as f:
+        f.write(b"foo")
+    assert read_snapshot(path) is None
+    assert len(load_thesaurus(path).refs()) == 3
+
+def test_snapshot_sorted(tmp_path):
+    path = str(tmp_path / "thesaurus.nt")
+    # Not parsed from the file, so give the triples in the order of the file
+    g = Thesaurus().parse(data=NT, format="nt")
+    write_sorted(g, path)
+    save_snapshot(g, path, sorted(g, key=nt_line))
+    t = read_snapshot(path)
+    parsed = Thesaurus().parse(path)
+    assert list(t) == list(parsed)
+    assert t.refs() == parsed.refs()
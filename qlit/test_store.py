@@ -0,0 +1,60 @@
+from pytest import raises
+from rdflib import Graph, Literal, OWL, RDF, SKOS, URIRef
+from .homosaurus import load_homosaurus
+from .simple import SimpleThesaurus, name_to_ref
+from .store import TermStore
+from .thesaurus import TermNotFoundError, Thesaurus
+
+T = Thesaurus().parse('qlit.nt')
+STORE = TermStore(T, load_homosaurus(T))
+
+def test_store_record():
+    record = STORE.records[STORE.find("ez04as46")]
+    assert record.name == "ez04as46"
+    assert record.uri == "https://queerlit.dh.gu.se/qlit/v1/ez04as46"
+    assert record.concept and not record.collection and not record.deprecated
+    assert record.prefLabel == "Syskon"
+    assert record.hiddenLabels == ()
+    assert [STORE.names[n] for n in record.broader] == ["um90bw50"]
+    exact = STORE.externals[record.exactMatch[0]]
+    assert (exact.uri, exact.prefLabel) == ("https://homosaurus.org/v3/homoit0001310", "Siblings")
+
+    with raises(TermNotFoundError):
+        STORE.find("foobar")
+
+def test_store_rdf():
+    for name in ["ez04as46", "lx88hn91"]:
+        ref = name_to_ref(name)
+        termset = STORE.termset(STORE.find(name))
+        assert termset.refs() == [ref]
+        assert termset.serialize(format="turtle") == T.get(ref).serialize(format="turtle")
+
+    g = STORE.graph()
+    assert set(g) == set(T)
+    assert g.refs() == T.refs()
+    assert g.serialize(format="turtle") == T.serialize(format="turtle")
+
+def test_store_relations():
+    t = Thesaurus()
+    food, fruit, old, elsewhere = (name_to_ref(name) for name in ["food", "fruit", "old", "elsewhere"])
+    for ref in [food, fruit, old]:
+        t.add((ref, RDF.type, SKOS.Concept))
+    t.add((fruit, SKOS.broader, food))
+    t.add((fruit, SKOS.broader, elsewhere))
+    t.add((old, OWL.deprecated, Literal(True)))
+    store = TermStore(t, Graph())
+
+    # Related resources that are not terms are numbered after the terms
+    broader = store.records[store.find("fruit")].broader
+    assert [store.names[n] for n in broader] == ["food", "elsewhere"]
+    assert store.terms(broader) == [store.find("food")]
+    assert list(store.roots) == [store.find("food"), store.find("old")]
+    assert len(store.termset(store.find("old"))) == 0
+
+    assert store.broader_transitive(store.find("fruit")) == [store.find("food")]
+    assert store.narrower_transitive(store.find("fruit")) == []
+
+    ts = SimpleThesaurus(store)
+    assert ts.get("fruit")["broader"] == ["food", "elsewhere"]
+    assert [term["name"] for term in ts.get_broader("fruit")] == ["food"]
+    assert [term["name"] for term in ts.get_roots()] == ["food"]
@@ -1,6 +1,6 @@
 from pytest import raises
-from rdflib import URIRef, RDF, SKOS
-from .thesaurus import Termset, Thesaurus, TermNotFoundError
+from rdflib import URIRef, Literal, OWL, RDF, SKOS
+from .thesaurus import Termset, Thesaurus, TermNotFoundError, transitive
 
 def test_termset():
     t = Termset()
@@ -105,3 +105,82 @@ def test_thesaurus_get_related():
     assert len(t.get_related(food)) == 0
     with raises(TermNotFoundError):
         t.get_related(URIRef("banana"))
+
+def test_termset_index():
+    t = Termset()
+    foo = URIRef("https://queerlit.dh.gu.se/qlit/v1/foo")
+    bar = URIRef("https://queerlit.dh.gu.se/qlit/v1/bar")
+    t += [(foo, RDF.type, SKOS.Concept), (foo, SKOS.prefLabel, Literal("Foo"))]
+    t.add((bar, RDF.type, SKOS.Collection))
+    assert t.refs() == [foo, bar]
+    assert t.find("foo") == foo
+    assert t.find("bar") == bar
+    # Only QLIT terms are found by name
+    baz = URIRef("https://homosaurus.org/v3/baz")
+    t.add((baz, RDF.type, SKOS.Concept))
+    with raises(TermNotFoundError):
+        t.find("baz")
+    t.remove((baz, None, None))
+
+    # Removing by pattern
+    t.remove((foo, None, None))
+    assert t.refs() == [bar]
+    assert t.concepts() == []
+    with raises(TermNotFoundError):
+        t.find("foo")
+
+    # Changing type
+    t.set((bar, RDF.type, SKOS.Concept))
+    assert t.concepts() == [bar]
+    assert t.collections() == []
+    assert t.find("bar") == bar
+
+    # Parsing
+    t.parse(data='<https://queerlit.dh.gu.se/qlit/v1/baz> a <http://www.w3.org/2004/02/skos/core#Concept> .', format='turtle')
+    assert t.concepts() == [bar, URIRef("https://queerlit.dh.gu.se/qlit/v1/baz")]
+    assert t.assert_term_exists(URIRef("https://queerlit.dh.gu.se/qlit/v1/baz"))
+
+def test_thesaurus_get_members():
+    t, food, fruit, vegetable, vegetarian = create_thesaurus()
+    termset = t.get_members(vegetarian)
+    assert len(termset) == 4
+    assert (fruit, RDF.type, SKOS.Concept) in termset
+    assert (vegetable, SKOS.broader, food) in termset
+    assert len(t.get_members(food)) == 0
+    with raises(TermNotFoundError):
+        t.get_members(URIRef("banana"))
+
+def test_thesaurus_index():
+    t, food, fruit, vegetable, vegetarian = create_thesaurus()
+    assert t.index.narrower[food] == [fruit]
+    assert t.index.broader[vegetable] == [food]
+    assert sorted(t.index.members[vegetarian]) == sorted([fruit, vegetable])
+    assert sorted(t.index.roots) == sorted([food, fruit])
+
+    # The index is rebuilt when the graph changes
+    t.add((fruit, OWL.deprecated, Literal(True)))
+    assert t.index.deprecated == {fruit}
+    assert len(t.get_narrower(food)) == 0
+    assert len(t.get_roots()) == 2
+
+def test_thesaurus_transitive():
+    t, food, fruit, vegetable, vegetarian = create_thesaurus()
+    apple = URIRef("https://queerlit.dh.gu.se/qlit/v1/apple")
+    t.add((apple, RDF.type, SKOS.Concept))
+    t.add((fruit, SKOS.narrower, apple))
+    t.add((apple, SKOS.broader, fruit))
+    t.add((fruit, SKOS.broader, food))
+    assert list(t.index.narrower_transitive[food]) == [fruit, apple]
+    assert list(t.index.broader_transitive[apple]) == [fruit, food]
+    assert t.has_broader_transitive(apple, food)
+    assert not t.has_broader_transitive(food, apple)
+    assert (apple, RDF.type, SKOS.Concept) in t.get_narrower_transitive(food)
+    assert len(t.get_broader_transitive(food)) == 0
+    with raises(TermNotFoundError):
+        t.get_narrower_transitive(URIRef("banana"))
+
+def test_transitive():
+    relation = {1: [3, 2], 2: [4], 3: [4, 1], 4: []}
+    assert transitive(1, relation.get) == [3, 2, 4]
+    assert transitive(1, relation.get, key=lambda n: n) == [2, 3, 4]
+    assert transitive(4, relation.get) == []
@@ -1,28 +1,88 @@
+from collections import defaultdict
+from collections.abc import Callable, Hashable, Iterable
+from functools import cached_property
 from rdflib import RDF, OWL, SKOS, Graph, Literal, URIRef
+from .metrics import timed
 
 BASE = 'https://queerlit.dh.gu.se/qlit/v1/'
 
+TERM_TYPES = (SKOS.Concept, SKOS.Collection)
+
 
 class Termset(Graph):
     """All the triples for a selected subset of the terms."""
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Terms by type, kept up to date on add and remove. Dicts keep insertion order.
+        self._terms: dict[URIRef, dict[URIRef, None]] = {t: dict() for t in TERM_TYPES}
+        # Incremented on every change, for invalidating derived data
+        self.version = 0
+
+    def add(self, triple):
+        super().add(triple)
+        self.version += 1
+        s, p, o = triple
+        if p == RDF.type and o in TERM_TYPES:
+            self._index_term(s, o)
+        return self
+
+    def addN(self, quads):
+        self.version += 1
+        def index(quads):
+            for s, p, o, c in quads:
+                if p == RDF.type and o in TERM_TYPES and isinstance(c, Graph) and c.identifier is self.identifier:
+                    self._index_term(s, o)
+                yield s, p, o, c
+        return super().addN(index(quads))
+
+    def remove(self, triple):
+        s, p, o = triple
+        # Find what term typings the pattern covers before removing them
+        typings = []
+        if p in (None, RDF.type) and o in (None, *TERM_TYPES):
+            typings = [(ts, to) for ts, _, to in self.triples((s, RDF.type, o)) if to in TERM_TYPES]
+        super().remove(triple)
+        self.version += 1
+        for ts, to in typings:
+            self._unindex_term(ts, to)
+        return self
+
+    def _index_term(self, ref: URIRef, rdf_type: URIRef):
+        self._terms[rdf_type][ref] = None
+
+    def _unindex_term(self, ref: URIRef, rdf_type: URIRef):
+        self._terms[rdf_type].pop(ref, None)
+
     def refs(self) -> list[URIRef]:
         """The URIRefs of the included terms."""
-        return [s for (s, p, o) in self if p == RDF.type and o in (SKOS.Concept, SKOS.Collection)]
+        return list({**self._terms[SKOS.Concept], **self._terms[SKOS.Collection]})
 
     def concepts(self) -> list[URIRef]:
         """The URIRefs of the included terms."""
-        return list(self.subjects(RDF.type, SKOS.Concept))
+        return list(self._terms[SKOS.Concept])
 
     def collections(self) -> list[URIRef]:
         """The URIRefs of the included collections."""
-        return list(self.subjects(RDF.type, SKOS.Collection))
+        return list(self._terms[SKOS.Collection])
 
+    def has_term(self, ref: URIRef) -> bool:
+        return any(ref in terms for terms in self._terms.values())
+
+    @timed('find')
     def assert_term_exists(self, ref):
-        if not ref in self.refs():
+        if not self.has_term(ref):
             raise TermNotFoundError(ref)
         return True
 
+    @timed('find')
+    def find(self, name: str) -> URIRef:
+        """Get the URIRef of a term by its name (the last part of the URI)."""
+        ref = URIRef(BASE + name)
+        if not self.has_term(ref):
+            raise TermNotFoundError(ref)
+        return ref
+
 class Thesaurus(Termset):
     """An RDF graph indended to contain a full thesaurus."""
 
@@ -33,22 +93,35 @@ class Thesaurus(Termset):
         self.add((self.scheme, RDF.type, SKOS.ConceptScheme))
         self.add((self.scheme, SKOS.prefLabel, Literal("Queerlit")))
         self.add((self.scheme, SKOS.notation, Literal("qlit")))
+        self._index = None
+
+    @property
+    def index(self) -> "ThesaurusIndex":
+        """Relations between terms, recomputed if the graph has changed."""
+        if not self._index or self._index.version != self.version:
+            self._index = ThesaurusIndex(self)
+        return self._index
 
     def terms_if(self, f) -> Termset:
         """Creates a subset with terms matching some condition."""
+        return self.terms_in(term for term in self.refs() if f(term))
+
+    @timed('select')
+    def terms_in(self, refs) -> Termset:
+        """Creates a subset with the given terms."""
+        deprecated = self.index.deprecated
         g = Termset(base=self.base)
-        for term in self.refs():
-            if f(term):
-                # Skip any deprecated term.
-                if self.value(term, OWL.deprecated):
-                    continue;
-                g += self.triples((term, None, None))
+        for term in refs:
+            # Skip any deprecated term.
+            if term in deprecated:
+                continue
+            g += self.triples((term, None, None))
         return g
 
     def get(self, ref: URIRef) -> Termset:
         """Get the triples of a single term."""
         self.assert_term_exists(ref)
-        return self.terms_if(lambda term: term == ref)
+        return self.terms_in([ref])
 
     def get_collections(self) -> Termset:
         """Find all collections."""
@@ -57,24 +130,108 @@ class Thesaurus(Termset):
             g += self.triples((ref, None, None))
         return g
 
+    def get_members(self, collection: URIRef) -> Termset:
+        """Find terms that are members of a given collection."""
+        self.assert_term_exists(collection)
+        return self.terms_in(self.index.members.get(collection, []))
+
     def get_roots(self) -> Termset:
         """Find all terms without parents."""
-        return self.terms_if(lambda term: self[term:RDF.type:SKOS.Concept] and not self.value(term, SKOS.broader))
+        return self.terms_in(self.index.roots)
 
     def get_narrower(self, broader: URIRef) -> Termset:
         """Find terms that are directly narrower than a given term."""
         self.assert_term_exists(broader)
-        return self.terms_if(lambda term: self[broader:SKOS.narrower:term])
+        return self.terms_in(self.index.narrower.get(broader, []))
 
     def get_broader(self, narrower: URIRef) -> Termset:
         """Find terms that are directly broader than a given term."""
         self.assert_term_exists(narrower)
-        return self.terms_if(lambda term: self[narrower:SKOS.broader:term])
+        return self.terms_in(self.index.broader.get(narrower, []))
 
     def get_related(self, other: URIRef) -> Termset:
         """Find terms that are related to a given term."""
         self.assert_term_exists(other)
-        return self.terms_if(lambda term: self[other:SKOS.related:term])
+        return self.terms_in(self.index.related.get(other, []))
+
+    def get_broader_transitive(self, narrower: URIRef) -> Termset:
+        """Find terms that are broader than a given term, directly or indirectly."""
+        self.assert_term_exists(narrower)
+        return self.terms_in(self.index.broader_transitive.get(narrower, []))
+
+    def get_narrower_transitive(self, broader: URIRef) -> Termset:
+        """Find terms that are narrower than a given term, directly or indirectly."""
+        self.assert_term_exists(broader)
+        return self.terms_in(self.index.narrower_transitive.get(broader, []))
+
+    def has_broader_transitive(self, narrower: URIRef, broader: URIRef) -> bool:
+        """Whether a term is broader than another, directly or indirectly."""
+        return broader in self.index.broader_transitive.get(narrower, ())
+
+
+class ThesaurusIndex:
+    """Relations between the terms of a thesaurus, collected in one pass over the graph."""
+
+    RELATIONS = {
+        SKOS.narrower: 'narrower',
+        SKOS.broader: 'broader',
+        SKOS.related: 'related',
+        SKOS.member: 'members',
+    }
+
+    def __init__(self, g: Thesaurus):
+        self.version = g.version
+        self.narrower: dict[URIRef, list[URIRef]] = defaultdict(list)
+        self.broader: dict[URIRef, list[URIRef]] = defaultdict(list)
+        self.related: dict[URIRef, list[URIRef]] = defaultdict(list)
+        self.members: dict[URIRef, list[URIRef]] = defaultdict(list)
+        self.deprecated: set[URIRef] = set()
+
+        for s, p, o in g:
+            if p in self.RELATIONS and g.has_term(o):
+                getattr(self, self.RELATIONS[p])[s].append(o)
+            elif p == OWL.deprecated and g.value(s, OWL.deprecated):
+                self.deprecated.add(s)
+
+        has_broader = set(g.subjects(SKOS.broader, None))
+        self.roots: list[URIRef] = [ref for ref in g.concepts() if ref not in has_broader]
+
+    # The transitive relations are computed on first use, once per version of the graph.
+    # Values are dicts, for ordered iteration and constant time lookup.
+
+    @cached_property
+    def broader_transitive(self) -> dict[URIRef, dict[URIRef, None]]:
+        """Broader terms of each term, directly broader first."""
+        return dict((ref, dict.fromkeys(transitive(ref, lambda r: self.broader.get(r, ()))))
+                    for ref in self.broader)
+
+    @cached_property
+    def narrower_transitive(self) -> dict[URIRef, dict[URIRef, None]]:
+        """Narrower terms of each term, directly narrower first."""
+        return dict((ref, dict.fromkeys(transitive(ref, lambda r: self.narrower.get(r, ()))))
+                    for ref in self.narrower)
+
+
+def transitive(start: Hashable, neighbours: Callable[[Hashable], Iterable], key: Callable = None) -> list:
+    """Everything reachable from a node through a relation, breadth-first so that the nearest come first.
+
+    Nodes at the same distance are ordered by `key`, if given. The start node is
+    not included, even if the relation has a cycle through it."""
+    seen = {start}
+    reached = []
+    level = [start]
+    while level:
+        next_level = []
+        for node in level:
+            for neighbour in neighbours(node):
+                if neighbour not in seen:
+                    seen.add(neighbour)
+                    next_level.append(neighbour)
+        if key:
+            next_level.sort(key=key)
+        reached += next_level
+        level = next_level
+    return reached
 
 
 class TermNotFoundError(KeyError):
@@ -1,8 +1,9 @@
-from qlit.server import app
+from qlit.server import app, start_reloading
 from werkzeug.middleware.proxy_fix import ProxyFix
 
 if __name__ == "__main__":
     app.wsgi_app = ProxyFix(
         app.wsgi_app, x_for=1, x_proto=1, x_host=1, x_prefix=1
     )
+    start_reloading()
     app.run()